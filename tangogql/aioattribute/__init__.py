@@ -1 +1,2 @@
+from .attribute import ReadError
 from .manager import SubscriptionManager
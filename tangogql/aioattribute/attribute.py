@@ -1,31 +1,55 @@
-import asyncio
-import PyTango
 from tango import EventType, DevFailed
 from tango import GreenMode
 from tango import DeviceProxy
 import logging as logger
+from .polling import PollingScheduler
+
+# Ways to monitor an attribute, in the order they are tried
+MECHANISMS = ("change", "periodic", "polling")
+EVENT_TYPES = {
+    "change": EventType.CHANGE_EVENT,
+    "periodic": EventType.PERIODIC_EVENT,
+}
+
+
+class ReadError:
+    """ A failed read of an attribute, passed to the listeners in place
+    of the read """
+
+    def __init__(self, name, errors):
+        self.name = name
+        self.errors = errors
 
 
 class Attribute:
     """ Handle tango subsciption/polling for one attribute"""
 
-    def __init__(self, name, polling_interval=3):
+    def __init__(self, name, polling_interval=3, config_callback=None,
+                 scheduler=None, mechanism=None):
         self.name = name
         logger.debug(f"Create attribute {name}")
         # Get Device Name
         self.attr = name.split("/")[-1]
         self.device = "/".join(name.split("/")[:-1])
         self.listeners = []
+        # Last read received, sent to new listeners right away
+        self.last_read = None
         # Create Proxy
         self.device_proxy = DeviceProxy(
             self.device, green_mode=GreenMode.Asyncio
         )
-        # Polling
+        # Polling, shared with the other polled attributes of the device
         self.is_polling = False
         self.polling_interval = polling_interval
-        self.polling_task = None
+        self.scheduler = scheduler or PollingScheduler()
         # Subscriptions
+        self.subscribed = False
         self.event_id = None
+        # Mechanism used, or the one to try first
+        self.mechanism = mechanism
+        # Configuration events, passed to config_callback(device, event)
+        self.config_callback = config_callback
+        self.config_event_id = None
 
     async def add_listener(self, listener):
         """ Subscribe to event or append a new listener
@@ -33,17 +57,23 @@ class Attribute:
         Event subscription is not blocking (delegated to a task)"""
         logger.debug(f"{self.name} add listener")
         # First client, setup tango connection
-        if not self.listeners:
+        if not self.subscribed:
             await self._subscribe()
         # Append listener
         self.listeners.append(listener)
+        # Late joiners get the current value without waiting for a change
+        if self.last_read is not None:
+            listener.put_nowait((self.device, self.last_read))
 
     def remove_listener(self, listener):
-        """ Remove listener on listener from event notification"""
+        """ Remove listener on listener from event notification.
+        The attribute stays subscribed until it is closed."""
         logger.debug(f"{self.name} Remove listener")
         self.listeners.remove(listener)
-        # Unsubscribe to the event if nobody is listening to it
-        if not self.listeners:
+
+    def close(self):
+        """ Stop monitoring the attribute """
+        if self.subscribed:
             self._unsubscribe()
 
     def _on_event(self, event):
@@ -51,9 +81,28 @@ class Attribute:
         logger.debug(f"{self.name} :: New event {event.event}")
         if event.err:
             logger.error(f"Error for on {self.device}/{self.name}:\n{event}")
+            self._notify_error(event.errors)
+            return
         # Propagate event to listeners
         self._notify_listeners(event.attr_value)
 
+    def _on_config_event(self, event):
+        """ Tango attribute configuration event callback """
+        logger.debug(f"{self.name} :: New configuration event")
+        self.config_callback(self.device, event)
+
+    async def _subscribe_config_events(self):
+        """ Follow configuration changes, if anyone is interested """
+        if self.config_callback is None:
+            return
+        try:
+            self.config_event_id = await self.device_proxy.subscribe_event(
+                self.attr, EventType.ATTR_CONF_EVENT, self._on_config_event,
+                green_mode=GreenMode.Asyncio
+            )
+        except DevFailed:
+            logger.info(f"{self.name} :: No configuration events")
+
     async def _subscribe_events(self, event_type):
         """ Try to connect to a tango event channel """
         # TODO, Be sure to not erase event id
@@ -63,64 +112,76 @@ class Attribute:
         logger.info(f"{self.name} :: Subscribe Event {event_type}")
 
     def _start_polling_task(self):
-        """ Start a periodic polling task to read the attribute"""
-
-        async def poll_coro():
-            """ Polling task corountine """
-            logger.info(f"{self.name} Start polling")
-            try:
-                while self.is_polling:
-                    try:
-                        logger.debug(f"{self.name} Polling loop")
-                        # Read attribute
-                        read = await self.device_proxy.read_attribute(
-                            self.attr, extract_as=PyTango.ExtractAs.List
-                        )
-                        self._notify_listeners(read)
-                    except DevFailed:
-                        pass  # TODO: Let the client know in an appropriate way
-                    # Schedule next read
-                    await asyncio.sleep(self.polling_interval)
-            except asyncio.CancelledError:
-                logger.debug(f"{self.name} Stop polling")
-
-        # Start task
+        """ Start reading the attribute periodically """
         self.is_polling = True
-        self.polling_task = asyncio.ensure_future(poll_coro())
+        self.scheduler.add(self)
 
     def _notify_listeners(self, value):
         """ Propagate value to listeners """
         if value:
+            self.last_read = value
             logger.debug(f"{self.name} notify listeners")
             # Feed listener queues
             for listener in self.listeners:
                 listener.put_nowait((self.device, value))
 
+    def _notify_error(self, errors):
+        """ Let listeners know that the attribute could not be read.
+        The error is the last read until a read succeeds again. """
+        self._notify_listeners(ReadError(self.attr, errors))
+
     async def _subscribe(self):
         """ Start monitoring an attribute in the best possible way:
            * change_event
            * periodic_event
            * active_polling
+        If the mechanism that worked last time is known, the ones before
+        it, which failed then, are skipped.
         """
-        try:
-            # Change event
-            await self._subscribe_events(EventType.CHANGE_EVENT)
-        except DevFailed:
-            try:
-                # Periodic Event
-                await self._subscribe_events(EventType.PERIODIC_EVENT)
-            except DevFailed:
+        mechanisms = list(MECHANISMS)
+        if self.mechanism in mechanisms:
+            mechanisms = mechanisms[mechanisms.index(self.mechanism):]
+        skipped = set()
+        for mechanism in mechanisms:
+            if mechanism in skipped:
+                continue
+            if mechanism == "polling":
                 # Start a periodic polling task
                 self._start_polling_task()
+                break
+            try:
+                await self._subscribe_events(EVENT_TYPES[mechanism])
+                break
+            except DevFailed as error:
+                # Periodic events need polling as well
+                if _reason(error) == "API_AttributePollingNotStarted":
+                    skipped.add("periodic")
+        self.mechanism = mechanism
+        self.subscribed = True
+        await self._subscribe_config_events()
 
     def _unsubscribe(self):
         """ Unsubscibe from event channels or cancel polling task"""
         logger.debug(f"{self.name} Unsubscribe event")
+        # Nothing will keep the last read up to date anymore
+        self.subscribed = False
+        self.last_read = None
+        if self.config_event_id:
+            self.device_proxy.unsubscribe_event(self.config_event_id)
+            self.config_event_id = None
         if self.event_id:
             # Unsubscribe event
             self.device_proxy.unsubscribe_event(self.event_id)
+            self.event_id = None
         elif self.is_polling:
-            # Stop polling task
+            # Stop polling
             self.is_polling = False
-            if not self.polling_task.done():
-                self.polling_task.cancel()
+            self.scheduler.remove(self)
+
+
+def _reason(error):
+    """ Reason of the first error of a DevFailed """
+    try:
+        return error.args[0].reason
+    except (IndexError, AttributeError):
+        return None
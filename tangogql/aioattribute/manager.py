@@ -1,5 +1,10 @@
 import asyncio
+from collections import OrderedDict
+from weakref import WeakValueDictionary
 from .attribute import Attribute
+from .polling import PollingScheduler
+from .queue import ConflatingQueue, _key
+from ..ttlcache import TTLCache
 
 try:
     from contextlib import asynccontextmanager as contextmanager  # +3.7
@@ -10,47 +15,241 @@ except ImportError:
 class SubscriptionManager:
     """ Manage attribute subscriptions """
 
-    def __init__(self):
+    def __init__(self, config_callback=None, queue_size=1000,
+                 concurrency=10, linger=10, max_lingering=1000,
+                 mechanism_ttl=600, background_concurrency=10):
         self.attributes = {}
-        self.lock = asyncio.Lock()
+        # Mechanism that worked for each attribute, tried first next time
+        self.mechanisms = TTLCache(ttl=mechanism_ttl, maxsize=10000)
+        # Attributes without listeners stay subscribed for linger seconds,
+        # at most max_lingering of them. Name -> timer, oldest first
+        self.linger = linger
+        self.max_lingering = max_lingering
+        self.lingering = OrderedDict()
+        # Pending reads kept per listener, at least one per attribute
+        self.queue_size = queue_size
+        self.config_callback = config_callback
+        self.scheduler = PollingScheduler()
+        # Devices whose subscriptions may be set up at the same time
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # Same for the background subscriptions of the server itself, so
+        # they do not hold up the clients
+        self.background_semaphore = asyncio.Semaphore(background_concurrency)
+        # Locks of the devices being subscribed to, dropped once unused
+        self.locks = WeakValueDictionary()
+
+    def _get_lock(self, device):
+        """ Return the lock serializing the subscriptions of a device """
+        key = device.lower()
+        lock = self.locks.get(key)
+        if lock is None:
+            lock = self.locks[key] = asyncio.Lock()
+        return lock
+
+    async def _add_listener(self, device, names, listener, added,
+                            semaphore):
+        """ Add a listener to attributes of one device, one at a time """
+        # Tango does not support concurent subscribitons on a device.
+        # Wait for the device first, not to hold a slot meanwhile
+        async with self._get_lock(device), semaphore:
+            for name in names:
+                attribute = self._get_attribute(name)
+                subscribed = attribute.subscribed
+                await attribute.add_listener(listener)
+                added.append(attribute)
+                if not subscribed:
+                    self._remember(name, attribute.mechanism)
+
+    def _remember(self, name, mechanism):
+        """ Remember the mechanism found for an attribute. Finding the
+        one already remembered does not extend its time, so that the
+        failed mechanisms are tried again once it expires. """
+        key = name.lower()
+        if key not in self.mechanisms or self.mechanisms[key] != mechanism:
+            self.mechanisms[key] = mechanism
 
     def _get_attribute(self, name):
         """ Create a new attribute subscribion or return an existing one"""
+        timer = self.lingering.pop(name, None)
+        if timer is not None:
+            timer.cancel()
         if name not in self.attributes:
-            self.attributes[name] = Attribute(name, polling_interval=1)
+            self.attributes[name] = Attribute(
+                name, polling_interval=1, config_callback=self.config_callback,
+                scheduler=self.scheduler,
+                mechanism=self.mechanisms.get(name.lower())
+            )
         return self.attributes[name]
 
+    def _release(self, attribute):
+        """ Close an attribute nobody listens to, after the linger time """
+        if attribute.listeners or attribute.name in self.lingering:
+            return
+        if self.linger <= 0 or self.max_lingering <= 0:
+            self._close(attribute.name)
+            return
+        loop = asyncio.get_event_loop()
+        self.lingering[attribute.name] = loop.call_later(
+            self.linger, self._close, attribute.name
+        )
+        while len(self.lingering) > self.max_lingering:
+            name, timer = self.lingering.popitem(last=False)
+            timer.cancel()
+            self._close(name)
+
+    def _close(self, name):
+        """ Unsubscribe from an attribute and forget it """
+        self.lingering.pop(name, None)
+        attribute = self.attributes.get(name)
+        if attribute is None or attribute.listeners:
+            return
+        del self.attributes[name]
+        attribute.close()
+
     @contextmanager
-    async def attribute_reads(self, names):
+    async def attribute_reads(self, names, min_interval=None,
+                              max_interval=None, background=False):
         """ Use as a context manager
          * Handle event subscription and unsubscription
-         * Return an asynchronous generator
-         * Spawn a value for each event
+         * Return an asynchronous iterator
+         * Spawn a value for each event, at most one per attribute every
+           min_interval seconds and at least one every max_interval
+         * Spawn a ReadError for each error event
+        Background subscriptions are set up apart from the others.
         """
         # Create listener
-        listener = asyncio.Queue()
-        # Tango does not support concurent subscribitons
-        # Be sure that the subscription are done one by one
-        async with self.lock:
-            for name in names:
-                # Send listener to all the required attributes.
-                attribute = self._get_attribute(name)
-                await attribute.add_listener(listener)
-
-        async def async_iterator():
-            """ asynchronous iterator to yield event from attributes """
-            try:
-                while True:
-                    # TODO: Make listener itearble ?
-                    read = await listener.get()
-                    listener.task_done()
-                    yield read
-            except asyncio.CancelledError:
-                return
-
-        # Yield generator
-        yield async_iterator()
-        # Unregister client
+        listener = ConflatingQueue(max(self.queue_size, len(names)))
+        # Send listener to all the required attributes, the devices
+        # in parallel
+        devices = {}
         for name in names:
-            attribute = self._get_attribute(name)
-            attribute.remove_listener(listener)
+            device = "/".join(name.split("/")[:-1])
+            devices.setdefault(device.lower(), []).append(name)
+        added = []
+        semaphore = (self.background_semaphore if background
+                     else self.semaphore)
+        reads = AttributeReads(listener, min_interval, max_interval)
+        try:
+            # Let every device finish before cleaning up after a failure
+            results = await asyncio.gather(*(
+                self._add_listener(device, device_names, listener, added,
+                                   semaphore)
+                for device, device_names in devices.items()
+            ), return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+            # Yield iterator
+            yield reads
+        finally:
+            reads.close()
+            # Unregister client
+            for attribute in added:
+                attribute.remove_listener(listener)
+                self._release(attribute)
+
+
+class AttributeReads:
+    """ Asynchronous iterator over the (device, read) items received by a
+    listener, with the counters of its queue
+
+    With a min_interval, a read arriving less than min_interval seconds
+    after the previous one of its attribute is held back, and the latest
+    held read is returned when the interval has passed. With a
+    max_interval, the last read of an attribute is repeated if nothing
+    was returned for it for max_interval seconds. """
+
+    def __init__(self, listener, min_interval=None, max_interval=None):
+        self.listener = listener
+        self.min_interval = min_interval or 0
+        self.max_interval = max_interval
+        # Time and item of the last read returned, per attribute
+        self._sent = {}
+        # Latest read held back by min_interval, per attribute
+        self._held = {}
+        # Pending listener read, kept across timeouts so nothing is lost
+        self._next = None
+
+    @property
+    def conflated(self):
+        """ Number of reads replaced by a newer read of the same attribute """
+        return self.listener.conflated
+
+    @property
+    def dropped(self):
+        """ Number of reads dropped because the queue was full """
+        return self.listener.dropped
+
+    async def get(self, timeout=None):
+        """ Wait for the next read, or return None after timeout seconds """
+        if (timeout is None and self._next is None
+                and not self.min_interval and not self.max_interval):
+            return await self._receive()
+        loop = asyncio.get_event_loop()
+        end = None if timeout is None else loop.time() + timeout
+        while True:
+            now = loop.time()
+            item, deadline = self._due(now)
+            if item is not None:
+                return self._send(item, now)
+            if end is not None:
+                if now >= end:
+                    return None
+                deadline = end if deadline is None else min(deadline, end)
+            if self._next is None:
+                self._next = asyncio.ensure_future(self._receive())
+            timeout = None if deadline is None else deadline - now
+            done, _ = await asyncio.wait([self._next], timeout=timeout)
+            if not done:
+                continue
+            item = self._next.result()
+            self._next = None
+            key = _key(item)
+            now = loop.time()
+            if key in self._held or (
+                key in self._sent
+                and now < self._sent[key][0] + self.min_interval
+            ):
+                self._held[key] = item
+                continue
+            return self._send(item, now)
+
+    def close(self):
+        """ Stop waiting for reads """
+        if self._next is not None:
+            self._next.cancel()
+            self._next = None
+
+    async def _receive(self):
+        read = await self.listener.get()
+        self.listener.task_done()
+        return read
+
+    def _send(self, item, now):
+        self._sent[_key(item)] = (now, item)
+        return item
+
+    def _due(self, now):
+        """ Return a read to send now, or else the time when one is due """
+        deadline = None
+        for key, item in self._held.items():
+            due = self._sent[key][0] + self.min_interval
+            if due <= now:
+                del self._held[key]
+                return item, None
+            deadline = due if deadline is None else min(deadline, due)
+        if self.max_interval:
+            for key, (sent, item) in self._sent.items():
+                if key in self._held:
+                    continue
+                due = sent + self.max_interval
+                if due <= now:
+                    return item, None
+                deadline = due if deadline is None else min(deadline, due)
+        return None, deadline
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
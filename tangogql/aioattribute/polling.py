@@ -0,0 +1,96 @@
+import asyncio
+import PyTango
+from tango import DevFailed
+import logging as logger
+
+
+class PollingScheduler:
+    """ Poll attributes in groups: one read_attributes call per device
+    and polling interval. Ticks of all groups with the same interval are
+    aligned on multiples of that interval."""
+
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, attribute):
+        """ Start polling an attribute """
+        key = (attribute.device.lower(), attribute.polling_interval)
+        if key not in self.groups:
+            self.groups[key] = PollingGroup(
+                attribute.device_proxy, attribute.polling_interval
+            )
+        self.groups[key].add(attribute)
+
+    def remove(self, attribute):
+        """ Stop polling an attribute """
+        key = (attribute.device.lower(), attribute.polling_interval)
+        group = self.groups.get(key)
+        if group is None:
+            return
+        group.remove(attribute)
+        if not group.attributes:
+            del self.groups[key]
+
+
+class PollingGroup:
+    """ Polled attributes of one device sharing a polling interval """
+
+    def __init__(self, device_proxy, polling_interval):
+        self.device_proxy = device_proxy
+        self.polling_interval = polling_interval
+        self.attributes = []
+        self.polling_task = None
+
+    def add(self, attribute):
+        self.attributes.append(attribute)
+        if self.polling_task is None:
+            self.polling_task = asyncio.ensure_future(self._poll_loop())
+
+    def remove(self, attribute):
+        self.attributes.remove(attribute)
+        if not self.attributes and self.polling_task is not None:
+            if not self.polling_task.done():
+                self.polling_task.cancel()
+            self.polling_task = None
+
+    async def _poll_loop(self):
+        """ Polling task coroutine """
+        loop = asyncio.get_event_loop()
+        logger.info(f"{self.device_proxy.dev_name()} Start polling")
+        try:
+            while self.attributes:
+                await self._poll()
+                # Sleep until the next multiple of the interval
+                now = loop.time()
+                interval = self.polling_interval
+                await asyncio.sleep(interval - now % interval)
+        except asyncio.CancelledError:
+            logger.debug(f"{self.device_proxy.dev_name()} Stop polling")
+
+    async def _poll(self):
+        """ Read all attributes of the group and notify their listeners """
+        attributes = list(self.attributes)
+        names = [attribute.attr for attribute in attributes]
+        logger.debug(f"{self.device_proxy.dev_name()} Polling {names}")
+        try:
+            reads = await self.device_proxy.read_attributes(
+                names, extract_as=PyTango.ExtractAs.Numpy
+            )
+        except DevFailed as error:
+            if len(names) == 1:
+                reads = [error]
+            else:
+                # One bad attribute should not stop the others
+                reads = await asyncio.gather(
+                    *(self.device_proxy.read_attribute(
+                        name, extract_as=PyTango.ExtractAs.Numpy
+                    ) for name in names),
+                    return_exceptions=True
+                )
+        for attribute, read in zip(attributes, reads):
+            if isinstance(read, Exception):
+                attribute._notify_error(read.args)
+            elif read.has_failed:
+                attribute._notify_error(read.get_err_stack())
+            else:
+                attribute._notify_listeners(read)
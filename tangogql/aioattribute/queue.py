@@ -0,0 +1,58 @@
+import asyncio
+
+
+class ConflatingQueue(asyncio.Queue):
+    """ Bounded queue of (device, read) items for one listener
+
+    Putting never blocks nor fails. When the queue is full, a new read
+    replaces the pending read of the same attribute (conflation); if the
+    attribute has no pending read, a read superseded by a newer one of
+    its attribute is discarded, or else the oldest read is dropped.
+    """
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        # Latest pending cell for each attribute
+        self._latest = {}
+        self.conflated = 0
+        self.dropped = 0
+
+    def _put(self, item):
+        cell = [item]
+        self._queue.append(cell)
+        self._latest[_key(item)] = cell
+
+    def _get(self):
+        cell = self._queue.popleft()
+        key = _key(cell[0])
+        if self._latest.get(key) is cell:
+            del self._latest[key]
+        return cell[0]
+
+    def put_nowait(self, item):
+        if not self.full():
+            return super().put_nowait(item)
+        cell = self._latest.get(_key(item))
+        if cell is not None:
+            cell[0] = item
+            self.conflated += 1
+            return
+        self._discard()
+        super().put_nowait(item)
+
+    def _discard(self):
+        """ Make room for one item """
+        for index, cell in enumerate(self._queue):
+            if self._latest.get(_key(cell[0])) is not cell:
+                del self._queue[index]
+                self.conflated += 1
+                break
+        else:
+            self._get()
+            self.dropped += 1
+        self.task_done()
+
+
+def _key(item):
+    device, read = item
+    return (device, read.name)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+"""
+Helpers for attribute values read as NumPy arrays
+
+Attribute values are read with PyTango.ExtractAs.Numpy, so spectrum and
+image values stay in one buffer. They are converted to Python lists only
+when they are sent as JSON, or else encoded straight from the buffer:
+
+ - "json" (the default): a (nested) list
+ - "base64": {"dtype": ..., "shape": [...], "data": ...} where data is the
+   base64 of the raw little endian values in row major order and dtype is
+   a NumPy dtype string such as "<f8"
+
+Before that, values may be cut down with `reduce`: sliced along their
+first axis (the points of a spectrum, the rows of an image), then
+downsampled to a number of points per axis, by keeping one point in n
+("decimate") or, for spectra, the minimum and maximum of each bucket
+("minmax").
+
+`diff` compares an array with the previous value of its attribute, for
+subscriptions sending only the elements that changed.
+"""
+
+__all__ = ['ENCODINGS', 'DOWNSAMPLINGS', 'to_builtin', 'encode', 'reduce',
+           'diff']
+
+import base64
+
+import numpy as np
+
+ENCODINGS = ("json", "base64")
+DOWNSAMPLINGS = ("decimate", "minmax")
+
+
+def to_builtin(value):
+    """ Convert NumPy arrays and scalars to Python lists and scalars """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def encode(value, encoding=None):
+    """ Return value in the requested encoding, see the module docstring.
+    Values that are not numeric arrays are left as they are. """
+    if encoding is None or encoding == "json":
+        return value
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding {encoding!r}, expected one of "
+                         f"{', '.join(ENCODINGS)}")
+    if not isinstance(value, np.ndarray) or value.dtype.kind not in "biuf":
+        return value
+    dtype = value.dtype.newbyteorder("<")
+    data = np.ascontiguousarray(value, dtype=dtype)
+    return {
+        "dtype": dtype.str,
+        "shape": list(value.shape),
+        "data": base64.b64encode(data).decode("ascii"),
+    }
+
+
+def reduce(value, start=None, stop=None, step=None, points=None,
+           downsample=None):
+    """ Slice value and downsample it to at most `points` points per axis,
+    see the module docstring. Scalars are left as they are. """
+    if not isinstance(value, (np.ndarray, list, tuple)):
+        return value
+    if downsample is not None and downsample not in DOWNSAMPLINGS:
+        raise ValueError(f"Unknown downsampling {downsample!r}, expected "
+                         f"one of {', '.join(DOWNSAMPLINGS)}")
+    if points is not None and points < 1:
+        raise ValueError("points must be at least 1")
+    if start is not None or stop is not None or step is not None:
+        value = value[start:stop:step]
+    if points is None:
+        return value
+    if downsample == "minmax":
+        return _minmax(value, points)
+    return _decimate(value, points)
+
+
+def _decimate(value, points):
+    """ Keep one point in n along each axis """
+    if not isinstance(value, np.ndarray):
+        return value[::_step(len(value), points)]
+    steps = tuple(slice(None, None, _step(size, points))
+                  for size in value.shape)
+    return value[steps]
+
+
+def _step(size, points):
+    return max(-(-size // points), 1)
+
+
+def _minmax(value, points):
+    """ Minimum and maximum of each bucket, for at most points // 2
+    buckets """
+    value = np.asarray(value)
+    if value.ndim != 1 or value.dtype.kind not in "biuf":
+        raise ValueError("minmax downsampling needs a numeric spectrum")
+    buckets = max(points // 2, 1)
+    if len(value) <= points or len(value) <= buckets:
+        return value
+    edges = np.linspace(0, len(value), buckets, endpoint=False).astype(int)
+    result = np.empty(2 * buckets, dtype=value.dtype)
+    result[0::2] = np.minimum.reduceat(value, edges)
+    result[1::2] = np.maximum.reduceat(value, edges)
+    return result
+
+
+def diff(previous, value):
+    """ Return the runs of elements of value that differ from previous, as
+    a list of (start, values) where start is an index in the flattened
+    array. Return None when value is not an array of the same shape and
+    type as previous, or when more than half of it changed. """
+    if not (isinstance(previous, np.ndarray) and isinstance(value, np.ndarray)):
+        return None
+    if previous.shape != value.shape or previous.dtype != value.dtype:
+        return None
+    previous = previous.ravel()
+    value = value.ravel()
+    changed = previous != value
+    if value.dtype.kind in "fc":
+        changed &= ~(np.isnan(previous) & np.isnan(value))
+    indices = np.flatnonzero(changed)
+    if len(indices) > len(value) // 2:
+        return None
+    if not len(indices):
+        return []
+    # Start and end of each run of consecutive indices
+    breaks = np.flatnonzero(np.diff(indices) > 1)
+    starts = indices[np.r_[0, breaks + 1]].tolist()
+    stops = (indices[np.r_[breaks, len(indices) - 1]] + 1).tolist()
+    return [(start, value[start:stop]) for start, stop in zip(starts, stops)]
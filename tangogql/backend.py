@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+A GraphQL backend caching parsed and validated documents
+
+Clients send the same few queries over and over, so each query string
+is only parsed and validated against the schema the first time. The
+documents are kept in a size bounded TTLCache keyed by the SHA-256 of
+the query string; documents failing validation are cached along with
+their errors. Syntax errors are not cached.
+"""
+
+__all__ = ['CachedBackend']
+
+from functools import partial
+from hashlib import sha256
+
+from graphql.backend.core import GraphQLCoreBackend
+from graphql.backend.base import GraphQLDocument
+from graphql.execution import execute, ExecutionResult
+from graphql.language.base import parse
+from graphql.validation import validate
+
+from tangogql.ttlcache import TTLCache
+
+
+class CachedBackend(GraphQLCoreBackend):
+    """GraphQLCoreBackend keeping the `maxsize` most recently used
+    documents."""
+
+    def __init__(self, maxsize=1000, executor=None):
+        super().__init__(executor=executor)
+        self.cache = TTLCache(ttl=None, maxsize=maxsize)
+
+    def document_from_string(self, schema, document_string):
+        if not isinstance(document_string, str):
+            return super().document_from_string(schema, document_string)
+        key = (id(schema), sha256(document_string.encode()).digest())
+        document = self.cache.get(key)
+        if document is None:
+            document_ast = parse(document_string)
+            errors = validate(schema, document_ast)
+            document = GraphQLDocument(
+                schema=schema,
+                document_string=document_string,
+                document_ast=document_ast,
+                execute=partial(_execute_validated, schema, document_ast,
+                                errors, **self.execute_params),
+            )
+            self.cache[key] = document
+        return document
+
+    def stats(self):
+        """Return the counters of the document cache"""
+        return self.cache.stats()
+
+
+def _execute_validated(schema, document_ast, errors, *args, **kwargs):
+    """Execute a document validated beforehand"""
+    if errors:
+        return ExecutionResult(errors=errors, invalid=True)
+    kwargs.pop("validate", None)
+    return execute(schema, document_ast, *args, **kwargs)
@@ -1,5 +1,7 @@
 import jwt
 
+from tangogql.loaders import AttributeReadLoader
+from tangogql.schema.base import proxies
 
 __all__ = ["build_context"]
 
@@ -28,5 +30,6 @@ def build_context(request, config):
 
     return {
         "client": ClientInfo(user, groups),
-        "config": config
+        "config": config,
+        "attribute_reads": AttributeReadLoader(proxies)
     }
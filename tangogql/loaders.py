@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+Batching loaders for device access during query resolution.
+
+A loader collects the requests made by resolvers during one iteration of
+the event loop and sends them to each device as a single call, instead of
+one call per resolver.
+"""
+
+import asyncio
+from collections import defaultdict
+
+import PyTango
+
+__all__ = ['AttributeReadLoader']
+
+
+class AttributeReadLoader(object):
+    """Batch attribute reads per device.
+
+    All reads requested for the same device within one event loop tick
+    are issued as one read_attributes call and the results are handed
+    back to each caller. Reads of the same attribute in the same tick
+    share the result.
+    """
+
+    def __init__(self, proxies, extract_as=PyTango.ExtractAs.Numpy):
+        self._proxies = proxies
+        self._extract_as = extract_as
+        self._pending = defaultdict(dict)
+        self._scheduled = False
+
+    def load(self, device, name):
+        """Return a future for the read of attribute `name` on `device`."""
+        loop = asyncio.get_event_loop()
+        futures = self._pending[device]
+        if name not in futures:
+            futures[name] = loop.create_future()
+            if not self._scheduled:
+                self._scheduled = True
+                loop.call_soon(self._dispatch)
+        return futures[name]
+
+    def _dispatch(self):
+        self._scheduled = False
+        pending, self._pending = self._pending, defaultdict(dict)
+        for device, futures in pending.items():
+            asyncio.ensure_future(self._read(device, futures))
+
+    async def _read(self, device, futures):
+        names = list(futures)
+        try:
+            proxy = self._proxies.get(device)
+        except Exception as error:
+            for future in futures.values():
+                _set_exception(future, error)
+            return
+        try:
+            if len(names) == 1:
+                reads = [await proxy.read_attribute(
+                    names[0], extract_as=self._extract_as)]
+            else:
+                reads = await proxy.read_attributes(
+                    names, extract_as=self._extract_as)
+        except Exception as error:
+            if len(names) == 1:
+                _set_exception(futures[names[0]], error)
+                return
+            # The whole call failed, e.g. because one of the names does
+            # not exist on the device. Read one by one so that the other
+            # requestors still get their values.
+            reads = await asyncio.gather(
+                *(proxy.read_attribute(name, extract_as=self._extract_as)
+                  for name in names),
+                return_exceptions=True)
+
+        for name, read in zip(names, reads):
+            future = futures[name]
+            if isinstance(read, Exception):
+                _set_exception(future, read)
+            elif getattr(read, "has_failed", False):
+                _set_exception(future, PyTango.DevFailed(*read.get_err_stack()))
+            elif not future.done():
+                future.set_result(read)
+
+
+def _set_exception(future, error):
+    if not future.done():
+        future.set_exception(error)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+"""
+MessagePack encoding of websocket messages
+
+NumPy arrays and lists of numbers are packed as typed binary blobs, in a
+MessagePack extension of type ARRAY_EXT_TYPE whose data is:
+ - the array.array typecode of the values, as one ASCII byte: "b", "h",
+   "i", "q" for int8 to int64, "B", "H", "I", "Q" for uint8 to uint64,
+   "f" for float32 and "d" for float64
+ - the number of dimensions, as one unsigned byte
+ - each dimension, as a little endian uint32
+ - the values, little endian, in row major order
+
+NumPy arrays keep their own type and are packed straight from their
+buffer. Lists are converted by NumPy, their integers into the narrowest
+type holding them all.
+
+Everything else is packed as plain MessagePack. The encoding is only
+available when the msgpack package is installed.
+"""
+
+__all__ = ['available', 'dumps', 'ARRAY_EXT_TYPE']
+
+import struct
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+available = msgpack is not None
+
+ARRAY_EXT_TYPE = 1
+
+# (dtype kind, item size) -> typecode
+TYPECODES = {
+    ("i", 1): "b", ("i", 2): "h", ("i", 4): "i", ("i", 8): "q",
+    ("u", 1): "B", ("u", 2): "H", ("u", 4): "I", ("u", 8): "Q",
+    ("f", 4): "f", ("f", 8): "d",
+}
+# Integer types tried for lists, narrowest first
+_LIST_INT_TYPES = (np.int8, np.int16, np.int32)
+
+
+def dumps(message):
+    """ Encode a message, with its numeric arrays as binary blobs """
+    return msgpack.packb(_encode(message), use_bin_type=True)
+
+
+def _encode(obj):
+    if isinstance(obj, dict):
+        return {key: _encode(value) for key, value in obj.items()}
+    if isinstance(obj, np.ndarray):
+        packed = _pack_array(obj)
+        if packed is not None:
+            return packed
+        return _encode(obj.tolist())
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (list, tuple)):
+        packed = _pack_list(obj)
+        if packed is not None:
+            return packed
+        return [_encode(value) for value in obj]
+    return obj
+
+
+def _pack_list(values):
+    """ Pack a (nested) list of numbers, or return None """
+    first = values
+    while isinstance(first, (list, tuple)):
+        if not first:
+            return None
+        first = first[0]
+    # Booleans stay booleans
+    if isinstance(first, bool) or not isinstance(first, (int, float)):
+        return None
+    try:
+        values = np.array(values)
+    except (ValueError, OverflowError):
+        # Ragged lists do not make an array
+        return None
+    if values.dtype.kind == "i" and values.size:
+        low, high = values.min(), values.max()
+        for dtype in _LIST_INT_TYPES:
+            limits = np.iinfo(dtype)
+            if limits.min <= low and high <= limits.max:
+                values = values.astype(dtype)
+                break
+    return _pack_array(values)
+
+
+def _pack_array(values):
+    """ Pack a NumPy array of numbers, or return None """
+    typecode = TYPECODES.get((values.dtype.kind, values.dtype.itemsize))
+    if typecode is None or not values.ndim:
+        return None
+    dtype = values.dtype.newbyteorder("<")
+    data = np.ascontiguousarray(values, dtype=dtype)
+    header = struct.pack(f"<cB{values.ndim}I", typecode.encode(),
+                         values.ndim, *values.shape)
+    return msgpack.ExtType(ARRAY_EXT_TYPE, header + data.tobytes())
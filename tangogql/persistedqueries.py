@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+"""
+Automatic persisted queries
+
+A client may send the SHA-256 of a query instead of its text, in the
+`extensions` of a request, as done by Apollo's persisted query link:
+
+    {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": ...}}}
+
+If the server does not know the hash, the request fails with a
+PersistedQueryNotFound error and the client sends it again with both
+the text and the hash, which registers the query. The store is a size
+bounded TTLCache keeping the most recently used queries.
+"""
+
+__all__ = ['PersistedQueries', 'PersistedQueryError']
+
+from hashlib import sha256
+
+from tangogql.ttlcache import TTLCache
+
+
+class PersistedQueryError(Exception):
+    """A persisted query could not be resolved"""
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+    def to_dict(self):
+        """Return the error as a GraphQL error"""
+        return {"message": str(self), "extensions": {"code": self.code}}
+
+
+class PersistedQueries:
+    """Store of the `maxsize` most recently used persisted queries"""
+
+    def __init__(self, maxsize=1000):
+        self.queries = TTLCache(ttl=None, maxsize=maxsize)
+
+    def get_query(self, payload):
+        """Return the query text of a request payload, registering it if
+        it comes with its hash."""
+        query = payload.get("query")
+        extensions = payload.get("extensions") or {}
+        if not isinstance(extensions, dict):
+            raise PersistedQueryError("extensions must be an object",
+                                      "BAD_PERSISTED_QUERY")
+        persisted = extensions.get("persistedQuery")
+        if not persisted:
+            return query
+        if not isinstance(persisted, dict):
+            raise PersistedQueryError("persistedQuery must be an object",
+                                      "BAD_PERSISTED_QUERY")
+        if persisted.get("version") != 1:
+            raise PersistedQueryError("PersistedQueryNotSupported",
+                                      "PERSISTED_QUERY_NOT_SUPPORTED")
+        digest = persisted.get("sha256Hash")
+        if not isinstance(digest, str):
+            raise PersistedQueryError("sha256Hash must be a string",
+                                      "BAD_PERSISTED_QUERY")
+        if query is not None and not isinstance(query, str):
+            raise PersistedQueryError("query must be a string",
+                                      "BAD_PERSISTED_QUERY")
+        if query is None:
+            query = self.queries.get(digest)
+            if query is None:
+                raise PersistedQueryError("PersistedQueryNotFound",
+                                          "PERSISTED_QUERY_NOT_FOUND")
+            return query
+        if sha256(query.encode()).hexdigest() != digest:
+            raise PersistedQueryError("provided sha does not match query",
+                                      "BAD_PERSISTED_QUERY")
+        self.queries[digest] = query
+        return query
+
+    def stats(self):
+        """Return the counters of the store"""
+        return self.queries.stats()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+"""
+Short lived cache of query results shared by all clients
+
+Identical read only queries arriving within `ttl` seconds of each other
+are executed once: the result is kept for `ttl` seconds, and requests
+arriving while it is computed wait for the same execution. Results are
+keyed by the normalized query (printed from the parsed document, so
+whitespace and comments do not matter), the operation name and the
+variables. Only mutations look at the client, to check its permissions
+and log its actions; query resolvers never do, so the client identity
+is not part of the key.
+
+Each result records the devices its query is limited to. Only queries
+made of `device(name: ...)`, `attributes(fullNames: ...)` and
+`commands(fullNames: ...)` fields with exact names are limited to some
+devices; any other query, such as `devices` with its default pattern,
+may depend on every device. A mutation drops the results that may
+depend on a device it changed; if its devices cannot be told, every
+result is dropped.
+"""
+
+__all__ = ['ResultCache', 'queried_devices', 'mutated_devices']
+
+import asyncio
+from functools import partial
+import json
+
+from graphql.language import ast
+from graphql.language.printer import print_ast
+
+from tangogql.ttlcache import TTLCache
+
+_MISSING = object()
+
+# Query fields limited to the devices named by one of their arguments
+_DEVICE_FIELDS = {"device": "name", "attributes": "fullNames",
+                  "commands": "fullNames"}
+
+
+class ResultCache:
+    """Results of the `maxsize` most recently used queries, kept for
+    `ttl` seconds."""
+
+    def __init__(self, ttl, maxsize=1000):
+        # key -> (devices, result)
+        self.cache = TTLCache(ttl=ttl, maxsize=maxsize)
+        # One running execution per key: key -> (devices, future)
+        self._calls = {}
+
+    def key(self, document, operation_name=None, variables=None):
+        """Return the cache key of an operation of a parsed document"""
+        normalized = getattr(document, "_normalized", None)
+        if normalized is None:
+            normalized = print_ast(document.document_ast)
+            document._normalized = normalized
+        return (normalized, operation_name,
+                json.dumps(variables, sort_keys=True, default=str))
+
+    async def get(self, document, operation_name, variables, execute):
+        """Return the cached result of a query, or the result of the
+        running or a new call to the coroutine function `execute`."""
+        key = self.key(document, operation_name, variables)
+        entry = self.cache.get(key, _MISSING)
+        if entry is not _MISSING:
+            return entry[1]
+        call = self._calls.get(key)
+        if call is None:
+            devices = queried_devices(document, operation_name, variables)
+            call = (devices, asyncio.ensure_future(execute()))
+            self._calls[key] = call
+            call[1].add_done_callback(partial(self._done, key, call))
+        return await asyncio.shield(call[1])
+
+    def _done(self, key, call, future):
+        # Results of executions started before an invalidation are not kept
+        if self._calls.get(key) is not call:
+            return
+        del self._calls[key]
+        if not future.cancelled() and future.exception() is None:
+            self.cache[key] = (call[0], future.result())
+
+    def invalidate(self, devices=None):
+        """Drop the results that may depend on devices, or all results"""
+        if devices is not None:
+            devices = {device.lower() for device in devices}
+        entries = [(key, entry[0]) for key, entry in self.cache.items()]
+        entries += [(key, call[0]) for key, call in self._calls.items()]
+        for key, queried in entries:
+            if devices is None or queried is None or queried & devices:
+                self.cache.pop(key, None)
+                self._calls.pop(key, None)
+
+    def stats(self):
+        """Return the counters of the cache"""
+        return self.cache.stats()
+
+
+def _operation(document, operation_name):
+    for definition in document.document_ast.definitions:
+        if not isinstance(definition, ast.OperationDefinition):
+            continue
+        name = definition.name.value if definition.name else None
+        if operation_name is None or name == operation_name:
+            return definition
+    return None
+
+
+def _argument(field, name, variables):
+    """Return the value of an argument of a field, or None"""
+    for argument in field.arguments:
+        if argument.name.value != name:
+            continue
+        value = argument.value
+        if isinstance(value, ast.Variable):
+            return variables.get(value.name.value)
+        if isinstance(value, ast.StringValue):
+            return value.value
+        if isinstance(value, ast.ListValue):
+            return [_literal(item, variables) for item in value.values]
+    return None
+
+
+def _literal(value, variables):
+    if isinstance(value, ast.Variable):
+        return variables.get(value.name.value)
+    if isinstance(value, ast.StringValue):
+        return value.value
+    return None
+
+
+def queried_devices(document, operation_name=None, variables=None):
+    """Return the lowercase names of the devices a query is limited to,
+    or None if it may depend on any device."""
+    operation = _operation(document, operation_name)
+    if operation is None:
+        return None
+    devices = set()
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, ast.Field):
+            return None
+        field = selection.name.value
+        if field.startswith("__"):
+            continue
+        if field not in _DEVICE_FIELDS:
+            return None
+        value = _argument(selection, _DEVICE_FIELDS[field], variables or {})
+        if field == "device":
+            names = [value]
+        else:
+            if not isinstance(value, list):
+                return None
+            names = [name.rsplit("/", 1)[0] if isinstance(name, str)
+                     else None for name in value]
+        for name in names:
+            # Device names may be patterns
+            if not isinstance(name, str) or any(c in name for c in "*?["):
+                return None
+            devices.add(name.lower())
+    return devices
+
+
+def mutated_devices(document, operation_name=None, variables=None):
+    """Return the values of the device arguments of the fields of a
+    mutation, or None if some field has none."""
+    operation = _operation(document, operation_name)
+    if operation is None:
+        return None
+    devices = set()
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, ast.Field):
+            return None
+        device = _argument(selection, "device", variables or {})
+        if not isinstance(device, str):
+            return None
+        devices.add(device)
+    return devices
@@ -5,18 +5,27 @@ from aiohttp import web
 
 import json
 import os
+from functools import partial
 
-from graphql_ws.aiohttp import AiohttpSubscriptionServer
 from graphql import format_error
 from graphql.execution.executors.asyncio import AsyncioExecutor
 
-from tangogql.schema.tango import tangoschema
+from tangogql.schema.tango import (
+    tangoschema, backend, persisted_queries, result_cache
+)
+from tangogql.schema.base import db
 from tangogql.auth import AuthError
+from tangogql.persistedqueries import PersistedQueryError
+from tangogql.resultcache import mutated_devices
 from tangogql.context import build_context
 
 from tangogql.schema.errors import ErrorParser
+from tangogql.serializer import dumps
+from tangogql.subscriptionserver import SubscriptionServer, PROTOCOLS
 
-subscription_server = AiohttpSubscriptionServer(tangoschema)
+subscription_server = SubscriptionServer(
+    tangoschema, backend=backend, persisted_queries=persisted_queries
+)
 routes = web.RouteTableDef()
 
 # FIXME: aiohttp doesn't support automatic serving of index files when serving
@@ -38,19 +47,104 @@ routes.static('/graphiql/js', 'static/graphiql/js')
 
 @routes.post("/db")
 async def db_handler(request):
-    """Serve GraphQL queries."""
-    loop = asyncio.get_event_loop()
+    """Serve GraphQL queries.
+
+    The payload is one operation, or a list of operations executed
+    concurrently with a shared context, answered by a list of results."""
     payload = await request.json()
-    query = payload.get("query")
-    variables = payload.get("variables")
-    config = request.app["config"]
-    context = build_context(request, config)
+    context = build_context(request, request.app["config"])
+    try:
+        if isinstance(payload, list):
+            results = await asyncio.gather(
+                *(_execute(operation, context) for operation in payload),
+                return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+            data = results
+        else:
+            data = await _execute(payload, context)
+    except web.HTTPException as error:
+        return error
+    return web.Response(
+        body=dumps(data), headers={"Content-Type": "application/json"}
+    )
+
+
+@routes.get("/db")
+async def db_get_handler(request):
+    """Serve GraphQL queries passed in the url, e.g. persisted queries.
+    Mutations are refused."""
+    payload = dict(request.query)
+    try:
+        for key in ("variables", "extensions"):
+            if key in payload:
+                payload[key] = json.loads(payload[key])
+    except ValueError:
+        return web.HTTPBadRequest(text=f"Invalid JSON in {key}")
+    context = build_context(request, request.app["config"])
+    try:
+        data = await _execute(payload, context, allow_mutations=False)
+    except web.HTTPException as error:
+        return error
+    return web.Response(
+        body=dumps(data), headers={"Content-Type": "application/json",
+                                   "Cache-Control": _cache_control(data)}
+    )
+
+
+def _cache_control(data):
+    """Let caches reuse a GET result for as long as the result cache
+    does. Only mutations depend on the client, and they are refused over
+    GET, so the result is the same for every client."""
+    if result_cache is None or "errors" in data:
+        return "no-cache"
+    return f"public, max-age={int(result_cache.cache.ttl)}"
+
 
+async def _execute(payload, context, allow_mutations=True):
+    """Execute one GraphQL operation and return its result.
+
+    Raise HTTPUnauthorized for authentication errors."""
+    if not isinstance(payload, dict):
+        return {"errors": [{"message": "An operation must be an object"}]}
+    try:
+        query = persisted_queries.get_query(payload)
+    except PersistedQueryError as error:
+        return {"errors": [error.to_dict()]}
+    variables = payload.get("variables")
+    operation_name = payload.get("operationName")
+    document = _get_document(query)
+    operation_type = None
+    if document is not None:
+        operation_type = document.get_operation_type(operation_name)
+    if not allow_mutations and operation_type == "mutation":
+        raise web.HTTPMethodNotAllowed("GET", ["POST"])
+
+    execute = partial(_run, query, variables, operation_name, context)
+    if result_cache is None:
+        return await execute()
+    if operation_type == "query":
+        return await result_cache.get(
+            document, operation_name, variables, execute)
+    data = await execute()
+    if operation_type == "mutation":
+        result_cache.invalidate(
+            mutated_devices(document, operation_name, variables)
+        )
+    return data
+
+
+async def _run(query, variables, operation_name, context):
+    loop = asyncio.get_event_loop()
     # Spawn query as a coroutine using asynchronous executor
     response = await tangoschema.execute(
         query,
         variable_values=variables,
+        operation_name=operation_name,
         context_value=context,
+        backend=backend,
         return_promise=True,
         executor=AsyncioExecutor(loop=loop),
     )
@@ -59,22 +153,43 @@ async def db_handler(request):
         for e in response.errors:
             if hasattr(e,"original_error"):
                 if isinstance(e.original_error, AuthError):
-                    return web.HTTPUnauthorized()    
+                    raise web.HTTPUnauthorized()
         parsed_errors = [ErrorParser.parse(e) for e in(response.errors)]
         if parsed_errors:
             data['errors'] = ErrorParser.remove_duplicated_errors(parsed_errors)
     if response.data:
         data["data"] = response.data
-    jsondata = json.dumps(data)
-
+    return data
+
+
+def _get_document(query):
+    """Return the parsed document of a query, or None if it is invalid"""
+    try:
+        return backend.document_from_string(tangoschema, query)
+    except Exception:
+        # Let the execution report the error
+        return None
+
+
+@routes.get("/stats")
+async def stats_handler(request):
+    """Serve the counters of the caches of the server."""
+    data = {
+        "documents": backend.stats(),
+        "persistedQueries": persisted_queries.stats(),
+        "database": db.stats(),
+    }
+    if result_cache is not None:
+        data["results"] = result_cache.stats()
     return web.Response(
-        text=jsondata, headers={"Content-Type": "application/json"}
+        body=dumps(data), headers={"Content-Type": "application/json"}
     )
 
 
 @routes.get("/socket")
 async def socket_handler(request):
-    ws = web.WebSocketResponse(protocols=("graphql-ws",))
+    ws = web.WebSocketResponse(protocols=PROTOCOLS)
     await ws.prepare(request)
-    await subscription_server.handle(ws)
+    context = build_context(request, request.app["config"])
+    await subscription_server.handle(ws, context)
     return ws
@@ -4,8 +4,9 @@ import PyTango
 from graphene import String, Float, ObjectType
 import asyncio
 
-from tangogql.schema.base import proxies
-from tangogql.schema.types import ScalarTypes, TypeConverter
+from tangogql.arrays import encode, reduce
+from tangogql.schema.base import attribute_reads, attribute_infos
+from tangogql.schema.types import ScalarTypes, TypeConverter, value_arguments
 
 async def collaborative_read_attribute(proxy, name):
     """
@@ -41,7 +42,7 @@ async def collaborative_read_attribute(proxy, name):
         setattr(proxy, value_attr, future)
         # Wait for data
         try:
-            read_value = await proxy.read_attribute(name, extract_as=PyTango.ExtractAs.List)
+            read_value = await proxy.read_attribute(name, extract_as=PyTango.ExtractAs.Numpy)
             # Set data for other requestors.
             future.set_result(read_value)
             setattr(proxy, reading_attr, False)
@@ -58,6 +59,14 @@ async def collaborative_read_attribute(proxy, name):
             setattr(proxy, reading_attr, False)
 
 
+def _get_read_loader(info):
+    """Return the attribute read loader of the current request."""
+    context = info.context
+    if isinstance(context, dict) and "attribute_reads" in context:
+        return context["attribute_reads"]
+    return attribute_reads
+
+
 class DeviceAttribute(ObjectType):
     """This class represents an attribute of a device."""
 
@@ -69,8 +78,8 @@ class DeviceAttribute(ObjectType):
     label = String()
     unit = String()
     description = String()
-    value = ScalarTypes()
-    writevalue = ScalarTypes()
+    value = ScalarTypes(**value_arguments())
+    writevalue = ScalarTypes(**value_arguments())
     quality = String()
     timestamp = Float()
     displevel= String()
@@ -82,101 +91,119 @@ class DeviceAttribute(ObjectType):
     _attr_read = None
     _attr_info = None
 
-    async def resolve_writevalue(self, *args, **kwargs):
+    async def resolve_writevalue(self, info, encoding=None, **kwargs):
         """This method fetch the coresponding w_value of an attribute bases on its name.
 
+        :param encoding: "json" (default) or "base64", see tangogql.arrays
+        :type encoding: str
+        :param kwargs: slicing and downsampling, see tangogql.arrays.reduce
+
         :return: W Value of the attribute.
         :rtype: Any
         """
 
-        read = await self._get_attr_read()
-        return read.w_value
+        read = await self._get_attr_read(info)
+        return encode(reduce(read.w_value, **kwargs), encoding)
 
-    async def resolve_value(self, *args, **kwargs):
+    async def resolve_value(self, info, encoding=None, **kwargs):
         """This method fetch the coresponding value of an attribute bases on its name.
 
+        :param encoding: "json" (default) or "base64", see tangogql.arrays
+        :type encoding: str
+        :param kwargs: slicing and downsampling, see tangogql.arrays.reduce
+
         :return: Value of the attribute.
         :rtype: Any
         """
 
-        read = await self._get_attr_read()
-        return read.value
+        read = await self._get_attr_read(info)
+        return encode(reduce(read.value, **kwargs), encoding)
 
-    async def resolve_quality(self, *args, **kwargs):
+    async def resolve_quality(self, info, *args, **kwargs):
         """This method fetch the coresponding quality of an attribute bases on its name.
 
         :return: The quality of the attribute.
         :rtype: str
         """
 
-        read = await self._get_attr_read()
+        read = await self._get_attr_read(info)
         return read.quality.name
 
-    async def resolve_timestamp(self, *args, **kwargs):
+    async def resolve_timestamp(self, info, *args, **kwargs):
         """This method fetch the timestamp value of an attribute bases on its name.
 
         :return: The timestamp value
         :rtype: float
         """
 
-        read = await self._get_attr_read()
+        read = await self._get_attr_read(info)
         sec = read.time.tv_sec
         usec = read.time.tv_usec
         return sec + usec * 1e-6
 
-    def resolve_dataformat(self, info):
-        return self._get_attr_info().data_format
+    async def resolve_dataformat(self, info):
+        attr_info = await self._get_attr_info()
+        return attr_info.data_format
 
-    def resolve_label(self, info):
-        return self._get_attr_info().label
+    async def resolve_label(self, info):
+        attr_info = await self._get_attr_info()
+        return attr_info.label
 
-    def resolve_unit(self, info):
-        return self._get_attr_info().unit
+    async def resolve_unit(self, info):
+        attr_info = await self._get_attr_info()
+        return attr_info.unit
 
-    def resolve_description(self, info):
-        return self._get_attr_info().description
+    async def resolve_description(self, info):
+        attr_info = await self._get_attr_info()
+        return attr_info.description
 
-    def resolve_displevel(self, info):
-        return self._get_attr_info().disp_level
+    async def resolve_displevel(self, info):
+        attr_info = await self._get_attr_info()
+        return attr_info.disp_level
 
-    def resolve_writable(self, info):
-        return str(self._get_attr_info().writable)
+    async def resolve_writable(self, info):
+        attr_info = await self._get_attr_info()
+        return str(attr_info.writable)
 
-    def resolve_datatype(self, info):
-        return self._get_datatype()
+    async def resolve_datatype(self, info):
+        return self._get_datatype(await self._get_attr_info())
 
-    def resolve_minvalue(self, info):
-        return self._convert_value("min_value")
+    async def resolve_minvalue(self, info):
+        return self._convert_value(await self._get_attr_info(), "min_value")
 
-    def resolve_maxvalue(self, info):
-        return self._convert_value("max_value")
+    async def resolve_maxvalue(self, info):
+        return self._convert_value(await self._get_attr_info(), "max_value")
 
-    def resolve_minalarm(self, info):
-        return self._convert_value("min_alarm")
+    async def resolve_minalarm(self, info):
+        return self._convert_value(await self._get_attr_info(), "min_alarm")
 
-    def resolve_maxalarm(self, info):
-        return self._convert_value("max_alarm")
+    async def resolve_maxalarm(self, info):
+        return self._convert_value(await self._get_attr_info(), "max_alarm")
 
-    async def _get_attr_read(self):
+    async def _get_attr_read(self, info):
         if self._attr_read is None:
-            proxy = proxies.get(self.device)
-            read_coro = proxy.read_attribute(self.name, extract_as=PyTango.ExtractAs.List)
-            self._attr_read = asyncio.ensure_future(read_coro)
+            # Reads of attributes on the same device are batched together
+            # by the request's loader.
+            loader = _get_read_loader(info)
+            self._attr_read = loader.load(self.device, self.name)
         return await self._attr_read
 
-    def _get_attr_info(self):
-        proxy = proxies.get(self.device)
-        return proxy.attribute_query(self.name)
+    async def _get_attr_info(self):
+        if self._attr_info is None:
+            # Shared by the fields of the attribute, fetched off the
+            # event loop when not cached.
+            self._attr_info = asyncio.ensure_future(
+                attribute_infos.get(self.device, self.name))
+        return await self._attr_info
 
-    def _get_datatype(self):
-        return PyTango.CmdArgType.values[self._get_attr_info().data_type]
+    def _get_datatype(self, attr_info):
+        return PyTango.CmdArgType.values[attr_info.data_type]
 
-    def _convert_value(self, key):
-        attr_info = self._get_attr_info()
+    def _convert_value(self, attr_info, key):
         value = getattr(attr_info, key)
 
         if value == "Not specified":
             return None
         else:
-            datatype = self._get_datatype()
+            datatype = self._get_datatype(attr_info)
             return TypeConverter.convert(datatype, value)
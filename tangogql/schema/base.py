@@ -1,9 +1,72 @@
 """Module containing the Base classes for the Tango Schema."""
 
+import os
 
-from tangogql.tangodb import CachedDatabase, DeviceProxyCache
+from tango import Database
+
+from tangogql.tangodb import (
+    AsyncDatabase, CachedDatabase, DeviceProxyCache, AttributeInfoCache,
+    DeviceIndex, DeviceStateCache, DeviceCalls
+)
 from tangogql.aioattribute import SubscriptionManager
+from tangogql.loaders import AttributeReadLoader
+
+# Number of threads for database calls, and how long a call may take
+DB_THREADS = int(os.environ.get("DB_THREADS", 4))
+DB_TIMEOUT = float(os.environ.get("DB_TIMEOUT", 10))
+# For how long expired database results may be served while refreshing
+DB_STALE_TTL = float(os.environ.get("DB_STALE_TTL", 0))
+# How often the index of device names is refreshed, in seconds
+DEVICE_INDEX_INTERVAL = float(os.environ.get("DEVICE_INDEX_INTERVAL", 10))
+# Maximum number of pending reads for each subscription
+SUBSCRIPTION_QUEUE_SIZE = int(os.environ.get("SUBSCRIPTION_QUEUE_SIZE", 1000))
+# Number of devices whose subscriptions may be set up at the same time
+SUBSCRIPTION_CONCURRENCY = int(
+    os.environ.get("SUBSCRIPTION_CONCURRENCY", 10)
+)
+# Seconds an attribute stays subscribed after its last subscriber left,
+# and how many attributes may be kept that way
+SUBSCRIPTION_LINGER = float(os.environ.get("SUBSCRIPTION_LINGER", 10))
+SUBSCRIPTION_MAX_LINGERING = int(
+    os.environ.get("SUBSCRIPTION_MAX_LINGERING", 1000)
+)
+# Number of devices whose state subscriptions may be set up at the same
+# time, apart from the client subscriptions
+SUBSCRIPTION_BACKGROUND_CONCURRENCY = int(
+    os.environ.get("SUBSCRIPTION_BACKGROUND_CONCURRENCY", 10)
+)
+# For how long the way an attribute could be monitored is remembered
+SUBSCRIPTION_MECHANISM_TTL = float(
+    os.environ.get("SUBSCRIPTION_MECHANISM_TTL", 600)
+)
+# How old a device state may be, and for how long the state of a device
+# is followed after it was last asked for, in seconds
+DEVICE_STATE_MAX_AGE = float(os.environ.get("DEVICE_STATE_MAX_AGE", 2))
+DEVICE_STATE_LINGER = float(os.environ.get("DEVICE_STATE_LINGER", 60))
+# Number of blocking device calls run at a time, overall and per host
+DEVICE_CALLS = int(os.environ.get("DEVICE_CALLS", 16))
+DEVICE_CALLS_PER_HOST = int(os.environ.get("DEVICE_CALLS_PER_HOST", 4))
 
-db = CachedDatabase(ttl=10)
+database = AsyncDatabase(Database(), max_workers=DB_THREADS,
+                         timeout=DB_TIMEOUT)
+db = CachedDatabase(database, ttl=10, stale_ttl=DB_STALE_TTL)
+device_index = DeviceIndex(database, interval=DEVICE_INDEX_INTERVAL)
 proxies = DeviceProxyCache()
-subscriptions = SubscriptionManager()
+device_calls = DeviceCalls(proxies, db, limit=DEVICE_CALLS,
+                           host_limit=DEVICE_CALLS_PER_HOST)
+attribute_infos = AttributeInfoCache(device_calls, ttl=60)
+subscriptions = SubscriptionManager(
+    config_callback=attribute_infos.on_config_event,
+    queue_size=SUBSCRIPTION_QUEUE_SIZE,
+    concurrency=SUBSCRIPTION_CONCURRENCY,
+    linger=SUBSCRIPTION_LINGER,
+    max_lingering=SUBSCRIPTION_MAX_LINGERING,
+    mechanism_ttl=SUBSCRIPTION_MECHANISM_TTL,
+    background_concurrency=SUBSCRIPTION_BACKGROUND_CONCURRENCY
+)
+device_states = DeviceStateCache(
+    proxies, subscriptions, max_age=DEVICE_STATE_MAX_AGE,
+    linger=DEVICE_STATE_LINGER
+)
+# Used when a query is executed without a request context
+attribute_reads = AttributeReadLoader(proxies)
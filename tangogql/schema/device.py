@@ -5,7 +5,9 @@ import fnmatch
 import PyTango
 from operator import attrgetter
 from graphene import String, Int, List, Boolean, Field, ObjectType
-from tangogql.schema.base import db, proxies
+from tangogql.schema.base import (
+    db, proxies, attribute_infos, device_states, device_calls
+)
 from tangogql.schema.attribute import DeviceAttribute
 from tangogql.schema.log import UserAction, user_actions
 
@@ -16,7 +18,7 @@ class DeviceProperty(ObjectType):
     device = String()
     value = List(String)
 
-    def resolve_value(self, info):
+    async def resolve_value(self, info):
         """ This method fetch the value of the property by its name.
 
         :return: A list of string contains the values corespond to the name of
@@ -26,7 +28,7 @@ class DeviceProperty(ObjectType):
 
         device = self.device
         name = self.name
-        value = db.get_device_property(device, name)
+        value = await db.get_device_property(device, name)
         if value:
             return [line for line in value[name]]
 
@@ -85,8 +87,7 @@ class Device(ObjectType):
         :rtype: str
         """
         try:
-            proxy = self._get_proxy()
-            return await proxy.state()
+            return await device_states.get(self.name)
         except (PyTango.DevFailed, PyTango.ConnectionFailed,
                 PyTango.CommunicationFailed, PyTango.DeviceUnlocked):
             return "UNKNOWN"
@@ -100,7 +101,7 @@ class Device(ObjectType):
         except PyTango.DevFailed:
             return None
 
-    def resolve_properties(self, info, pattern="*"):
+    async def resolve_properties(self, info, pattern="*"):
         """This method fetch the properties of the device.
 
         :param pattern: Pattern for filtering the result.
@@ -110,8 +111,7 @@ class Device(ObjectType):
         :return: List of properties for the device.
         :rtype: List of DeviceProperty
         """
-        #TODO:Db calls are not asynchronous in tango
-        props = db.get_device_property_list(self.name, pattern)
+        props = await db.get_device_property_list(self.name, pattern)
         return [DeviceProperty(name=p, device=self.name) for p in props]
 
     async def resolve_attributes(self, info, pattern="*"):
@@ -129,8 +129,10 @@ class Device(ObjectType):
 
         result = []
         if await self._get_connected():
-            proxy = self._get_proxy()
-            attr_infos = proxy.attribute_list_query()
+            attr_infos = await device_calls.call(
+                self.name, "attribute_list_query_ex")
+            # Keep the configurations for the attribute field resolvers
+            attribute_infos.update(self.name, attr_infos)
 
             rule = re.compile(fnmatch.translate(pattern), re.IGNORECASE)
             sorted_info = sorted(attr_infos, key=attrgetter("name"))
@@ -155,8 +157,8 @@ class Device(ObjectType):
         :rtype: List of DeviceCommand
         """
         if await self._get_connected():
-            proxy = self._get_proxy()
-            cmd_infos = proxy.command_list_query()
+            cmd_infos = await device_calls.call(
+                self.name, "command_list_query")
             rule = re.compile(fnmatch.translate(pattern), re.IGNORECASE)
 
             def create_device_command(cmd_info):
@@ -167,7 +169,7 @@ class Device(ObjectType):
                                     intypedesc=cmd_info.in_type_desc,
                                     outtype=cmd_info.out_type,
                                     outtypedesc=cmd_info.out_type_desc,
-                                    device=proxy.name()
+                                    device=self.name
                                     )
 
             return [create_device_command(a)
@@ -183,31 +185,30 @@ class Device(ObjectType):
         :rtype: List of DeviceInfo
         """
         if await self._get_connected():
-            proxy = self._get_proxy()
-            dev_info = proxy.info()
+            dev_info = await device_calls.call(self.name, "info")
             return DeviceInfo(id=dev_info.server_id,
                             host=dev_info.server_host)
             
-    def resolve_exported(self, info):
+    async def resolve_exported(self, info):
         """ This method fetch the infomation about the device if it is exported or not.
 
         :return: True if exported, False otherwise.
         :rtype: bool
         """
 
-        return self._get_info().exported
+        return (await self._get_info()).exported
 
-    def resolve_device_class(self, info):
-        return self._get_info().class_name
+    async def resolve_device_class(self, info):
+        return (await self._get_info()).class_name
 
-    def resolve_pid(self, info):
-        return self._get_info().pid
+    async def resolve_pid(self, info):
+        return (await self._get_info()).pid
 
-    def resolve_started_date(self, info):
-        return self._get_info().started_date
+    async def resolve_started_date(self, info):
+        return (await self._get_info()).started_date
 
-    def resolve_stopped_date(self, info):
-        return self._get_info().stopped_date
+    async def resolve_stopped_date(self, info):
+        return (await self._get_info()).stopped_date
 
     async def resolve_connected(self, info):
         return await self._get_connected()
@@ -220,19 +221,18 @@ class Device(ObjectType):
     async def _get_connected(self):
         if not hasattr(self, "_connected"):
             try:
-                proxy = self._get_proxy()
-                await proxy.state()
+                await device_states.get(self.name)
                 self._connected = True
             except (PyTango.DevFailed, PyTango.ConnectionFailed):
                 self._connected = False
         return self._connected
 
 
-    def _get_info(self):
+    async def _get_info(self):
         """This method fetch all the information of a device."""
 
         if not hasattr(self, "_info"):
-            self._info = db.get_device_info(self.name)
+            self._info = await db.get_device_info(self.name)
         return self._info
 
     
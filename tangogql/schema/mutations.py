@@ -159,7 +159,7 @@ class PutDeviceProperty(Mutation):
 
     @authentication
     @authorization
-    def mutate(self, info, device, name, value=""):
+    async def mutate(self, info, device, name, value=""):
         """ This method adds property to a device.
 
         :param device: Name of a device
@@ -180,7 +180,7 @@ class PutDeviceProperty(Mutation):
         # wait = not args.get("async")
         try:
             
-            db.put_device_property(device, {name: value})
+            await db.put_device_property(device, {name: value})
             log = PutDevicePropertyUserAction(
                                             timestamp = datetime.now(), 
                                             user = info.context["client"].user,
@@ -210,7 +210,7 @@ class DeleteDeviceProperty(Mutation):
 
     @authentication
     @authorization
-    def mutate(self, info, device, name):
+    async def mutate(self, info, device, name):
         """This method delete a property of a device.
 
         :param device: Name of the device
@@ -226,7 +226,7 @@ class DeleteDeviceProperty(Mutation):
         logger.info("MUTATION - DeleteDeviceProperty - User: {}, Device: {}, Name: {}".format(info.context["client"].user, device, name))
         
         try: 
-            db.delete_device_property(device, name)
+            await db.delete_device_property(device, name)
             log = DeleteDevicePropertyUserAction(
                                             timestamp = datetime.now(), 
                                             user = info.context["client"].user,
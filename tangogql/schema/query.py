@@ -1,13 +1,15 @@
 """Module containing Queries."""
 
+import asyncio
 import re
 import fnmatch
-import PyTango
 import copy
 from collections import defaultdict
 from graphene import ObjectType, String, List, Field, Int
 from tangogql.schema.types import ScalarTypes
-from tangogql.schema.base import db, proxies
+from tangogql.schema.base import (
+    db, attribute_infos, device_index, device_calls
+)
 from tangogql.schema.device import Device, DeviceCommand
 from tangogql.schema.attribute import DeviceAttribute
 from tangogql.schema.log import user_actions, UserAction
@@ -19,8 +21,7 @@ class Member(Device):
     domain = String()
     family = String()
 
-    @property
-    def info(self):
+    async def _get_info(self):
         """This method fetch a member of the device using the name of the
         domain and family.
         """
@@ -30,7 +31,7 @@ class Member(Device):
             #       than python 3.6, then use format ... buuuuuutttt,
             #       let's have some fun with the new f-strings
             devicename = f"{self.domain}/{self.family}/{self.name}"
-            self._info = db.get_device_info(devicename)
+            self._info = await db.get_device_info(devicename)
         return self._info
 
 
@@ -41,7 +42,7 @@ class Family(ObjectType):
     domain = String()
     members = List(Member, pattern=String())
 
-    def resolve_members(self, info, pattern="*"):
+    async def resolve_members(self, info, pattern="*"):
         """This method fetch members using the name of the domain and pattern.
 
         :param pattern: Pattern for filtering of the result.
@@ -52,7 +53,8 @@ class Family(ObjectType):
         :rtype: List of Member
         """
 
-        members = db.get_device_member(f"{self.domain}/{self.name}/{pattern}")
+        members = await device_index.get_members(self.domain, self.name,
+                                                 pattern)
         return [Member(domain=self.domain, family=self.name, name=member)
                 for member in members]
 
@@ -63,7 +65,7 @@ class Domain(ObjectType):
     name = String()
     families = List(Family, pattern=String())
 
-    def resolve_families(self, info, pattern="*"):
+    async def resolve_families(self, info, pattern="*"):
         """This method fetch a list of families using pattern.
 
         :param pattern: Pattern for filtering of the result.
@@ -74,7 +76,7 @@ class Domain(ObjectType):
             families([Family]):List of families.
         """
 
-        families = db.get_device_family(f"{self.name}/{pattern}/*")
+        families = await device_index.get_families(self.name, pattern)
         return [Family(name=family, domain=self.name) for family in families]
 
 
@@ -94,8 +96,9 @@ class ServerInstance(ObjectType):
     server = String()
     classes = List(DeviceClass, pattern=String())
 
-    def resolve_classes(self, info, pattern="*"):
-        devs_clss = db.get_device_class_list(f"{self.server}/{self.name}")
+    async def resolve_classes(self, info, pattern="*"):
+        devs_clss = await db.get_device_class_list(
+            f"{self.server}/{self.name}")
         mapping = defaultdict(list)
         rule = re.compile(fnmatch.translate(pattern), re.IGNORECASE)
 
@@ -114,7 +117,7 @@ class Server(ObjectType):
     name = String()
     instances = List(ServerInstance, pattern=String())
 
-    def resolve_instances(self, info, pattern="*"):
+    async def resolve_instances(self, info, pattern="*"):
         """ This method fetches all the intances using pattern.
 
         :param pattern: Pattern for filtering the result.
@@ -125,7 +128,7 @@ class Server(ObjectType):
         :rtype: List of ServerIntance
         """
 
-        instances = db.get_instance_name_list(self.name)
+        instances = await db.get_instance_name_list(self.name)
         rule = re.compile(fnmatch.translate(pattern), re.IGNORECASE)
         return [ServerInstance(name=inst, server=self.name)
                 for inst in instances if rule.match(inst)]
@@ -149,8 +152,7 @@ class Query(ObjectType):
     commands = List(DeviceCommand, full_names=List(String, required=True))
 
     async def resolve_info(self, info):
-        db = PyTango.Database()
-        return db.get_info()
+        return await db.get_info()
 
     async def resolve_device(self, info, name=None):
         """ This method fetches the device using the name.
@@ -161,7 +163,7 @@ class Query(ObjectType):
         :return:  Device.
         :rtype: Device    
         """
-        device_names = db.get_device_exported(name)
+        device_names = await device_index.get_exported(name)
         if len(device_names) == 1:
             return Device(name=device_names[0])
         else:
@@ -177,7 +179,7 @@ class Query(ObjectType):
         :return: List of devices.
         :rtype: List of Device    
         """
-        device_names = db.get_device_exported(pattern)
+        device_names = await device_index.get_exported(pattern)
         return [Device(name=name) for name in device_names]
 
     async def resolve_attributes(self, info, full_names):
@@ -189,9 +191,14 @@ class Query(ObjectType):
             device = '/'.join(parts)
             attr_list[device].append(attribute)
                 
-        for device, attrs in attr_list.items():
-            proxy = proxies.get(device)
-            attr_infos = proxy.attribute_list_query()
+        # Query all the devices at the same time
+        all_attr_infos = await asyncio.gather(*(
+            device_calls.call(device, "attribute_list_query_ex")
+            for device in attr_list
+        ))
+        for (device, attrs), attr_infos in zip(attr_list.items(),
+                                               all_attr_infos):
+            attribute_infos.update(device, attr_infos)
 
             for attr_info in attr_infos:
                 if attr_info.name in attrs:
@@ -211,9 +218,13 @@ class Query(ObjectType):
             device_name = '/'.join(parts)
             cmd_list[device_name].append(command_name)
 
-        for device_name, command_names in cmd_list.items():
-            proxy = proxies.get(device_name)
-            cmd_infos = proxy.command_list_query()
+        # Query all the devices at the same time
+        all_cmd_infos = await asyncio.gather(*(
+            device_calls.call(device_name, "command_list_query")
+            for device_name in cmd_list
+        ))
+        for (device_name, command_names), cmd_infos in zip(cmd_list.items(),
+                                                           all_cmd_infos):
 
             for cmd_info in cmd_infos:
                 if cmd_info.cmd_name in command_names:
@@ -229,7 +240,7 @@ class Query(ObjectType):
 
         return result
 
-    def resolve_domains(self, info, pattern="*"):
+    async def resolve_domains(self, info, pattern="*"):
         """This method fetches all the domains using the pattern.
 
         :param pattern: Pattern for filtering the result.
@@ -239,10 +250,10 @@ class Query(ObjectType):
         :return: List of domains.
         :rtype: List of Domain
         """
-        domains = db.get_device_domain("%s/*" % pattern)
+        domains = await device_index.get_domains(pattern)
         return [Domain(name=d) for d in sorted(domains)]
 
-    def resolve_families(self, info, domain="*", pattern="*"):
+    async def resolve_families(self, info, domain="*", pattern="*"):
         """This method fetches all the families using the pattern.
 
         :param domain: Domain for filtering the result.
@@ -256,10 +267,11 @@ class Query(ObjectType):
         :rtype: List of Family
         """
 
-        families = db.get_device_family(f"{domain}/{pattern}/*")
+        families = await device_index.get_families(domain, pattern)
         return [Family(domain=domain, name=d) for d in sorted(families)]
 
-    def resolve_members(self, info, domain="*", family="*", pattern="*"):
+    async def resolve_members(self, info, domain="*", family="*",
+                              pattern="*"):
         """This method fetches all the members using the pattern.
 
         :param domain: Domain for filtering the result.
@@ -276,11 +288,11 @@ class Query(ObjectType):
         :rtype: List of Domain
         """
 
-        members = db.get_device_member(f"{domain}/{family}/{pattern}")
+        members = await device_index.get_members(domain, family, pattern)
         return [Member(domain=domain, family=family, name=member)
                 for member in sorted(members)]
 
-    def resolve_servers(self, info, pattern="*"):
+    async def resolve_servers(self, info, pattern="*"):
         """ This method fetches all the servers using the pattern.
 
         :param pattern: Pattern for filtering the result.
@@ -291,7 +303,7 @@ class Query(ObjectType):
         :rtype: List of Server.
         """
 
-        servers = db.get_server_name_list()
+        servers = await db.get_server_name_list()
         # The db service does not allow wildcard here, but it can still
         # useful to limit the number of children. Let's fake it!
         rule = re.compile(fnmatch.translate(pattern), re.IGNORECASE)
@@ -1,49 +1,252 @@
 """Module containing the Subscription implementation."""
-from graphene import ObjectType, String, Float, Field, List
-from tangogql.schema.types import ScalarTypes
+import asyncio
+import numpy as np
+from graphene import ObjectType, String, Float, Int, Boolean, Field, List
+from graphql.language import ast
+from tangogql.arrays import encode, reduce, diff
+from tangogql.schema.types import ScalarTypes, value_arguments
 from tangogql.schema.base import subscriptions as subs
+from tangogql.aioattribute import ReadError
 
 import traceback
 
 
+class ValueChange(ObjectType):
+    """A run of changed elements of an array value, starting at index
+    `start` of the flattened array."""
+    start = Int()
+    values = ScalarTypes(encoding=String())
+
+    def resolve_values(self, info, encoding=None):
+        return encode(self.values, encoding)
+
+
 class AttributeFrame(ObjectType):
     attribute = String()
     device = String()
     full_name = String()
-    value = ScalarTypes()
-    write_value = ScalarTypes()
+    value = ScalarTypes(**value_arguments())
+    write_value = ScalarTypes(**value_arguments())
     quality = String()
     timestamp = Float()
+    # Counters of the subscription, for clients too slow to get every event
+    conflated = Int()
+    dropped = Int()
+    # With delta subscriptions, frames that are not keyframes have no value
+    # but the changes since the previous frame of the attribute
+    keyframe = Boolean()
+    changes = List(ValueChange)
 
     def resolve_full_name(self, info):
         return f"{self.device}/{self.attribute}"
 
+    def resolve_value(self, info, encoding=None, **kwargs):
+        return encode(reduce(self.value, **kwargs), encoding)
+
+    def resolve_write_value(self, info, encoding=None, **kwargs):
+        return encode(reduce(self.write_value, **kwargs), encoding)
+
 
 SLEEP_DURATION = 3.0
+# Default time in seconds to collect frames for one batch
+BATCH_WINDOW = 0.1
+# Default number of frames between two keyframes of delta subscriptions
+KEYFRAME_INTERVAL = 100
+
+
+def _get_send_window(info):
+    """Return the flow control semaphore of the subscription, if any."""
+    context = info.context
+    if isinstance(context, dict):
+        return context.get("send_window")
+    return None
+
+
+class _Deltas:
+    """Last values sent by a delta subscription, per attribute."""
+
+    def __init__(self, keyframe_interval):
+        self.keyframe_interval = keyframe_interval
+        # (device, attribute) -> (value, write value, frames since keyframe)
+        self.sent = {}
+
+    def update(self, device, read, frame):
+        """Turn a frame into a delta frame, unless a keyframe is due."""
+        key = (device, read.name)
+        value, write_value, count = self.sent.get(key, (None, None, None))
+        changes = None
+        if count is not None and count + 1 < self.keyframe_interval:
+            changes = diff(value, read.value)
+        if changes is None:
+            frame.keyframe = True
+            self.sent[key] = (read.value, read.w_value, 0)
+            return frame
+        frame.keyframe = False
+        frame.value = None
+        frame.changes = [ValueChange(start=start, values=values)
+                         for start, values in changes]
+        if _equal(write_value, read.w_value):
+            frame.write_value = None
+        self.sent[key] = (read.value, read.w_value, count + 1)
+        return frame
+
+
+def _equal(a, b):
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(a, b)
+    return a == b
+
+
+# Arguments of the value fields that change the shape of the values
+REDUCE_ARGUMENTS = {"start", "stop", "step", "points", "downsample"}
+
+
+def _get_deltas(info, delta, keyframe_interval):
+    """Return the delta state of a subscription, if delta is set.
+
+    Changes index the full value, so they cannot be combined with the
+    slicing and downsampling arguments of the value fields."""
+    if not delta:
+        return None
+    selection_sets = [field.selection_set for field in info.field_asts]
+    while selection_sets:
+        selection_set = selection_sets.pop()
+        if selection_set is None:
+            continue
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.FragmentSpread):
+                fragment = info.fragments[selection.name.value]
+                selection_sets.append(fragment.selection_set)
+            elif isinstance(selection, ast.InlineFragment):
+                selection_sets.append(selection.selection_set)
+            elif (selection.name.value in ("value", "writeValue")
+                  and any(argument.name.value in REDUCE_ARGUMENTS
+                          for argument in selection.arguments)):
+                raise ValueError(
+                    "delta cannot be combined with the start, stop, step, "
+                    "points or downsample arguments of value and writeValue")
+    return _Deltas(keyframe_interval)
+
+
+async def _get_read(attribute_reads, timeout=None):
+    """Wait for the next successful read, or return None after timeout
+    seconds. Read errors are not sent to clients."""
+    loop = asyncio.get_event_loop()
+    end = None if timeout is None else loop.time() + timeout
+    while True:
+        remaining = None if end is None else max(end - loop.time(), 0)
+        item = await attribute_reads.get(timeout=remaining)
+        if item is None or not isinstance(item[1], ReadError):
+            return item
+
+
+def _make_frame(device, read, attribute_reads, deltas=None):
+    """Build the frame of a read received by a subscription."""
+    sec = read.time.tv_sec
+    micro = read.time.tv_usec
+    timestamp = sec + micro * 1e-6
+    value = read.value
+    write_value = read.w_value
+    quality = read.quality.name
+    frame = AttributeFrame(
+        device=device,
+        attribute=read.name,
+        value=value,
+        write_value=write_value,
+        quality=quality,
+        timestamp=timestamp,
+        conflated=attribute_reads.conflated,
+        dropped=attribute_reads.dropped,
+    )
+    if deltas is not None:
+        return deltas.update(device, read, frame)
+    return frame
 
 
 class Subscription(ObjectType):
-    attributes = Field(AttributeFrame, full_names=List(String, required=True))
+    attributes = Field(AttributeFrame, full_names=List(String, required=True),
+                       min_interval=Float(), max_interval=Float(),
+                       delta=Boolean(), keyframe_interval=Int())
+    attribute_batches = Field(List(AttributeFrame),
+                              full_names=List(String, required=True),
+                              window=Float(), min_interval=Float(),
+                              max_interval=Float(), delta=Boolean(),
+                              keyframe_interval=Int())
+
+    async def resolve_attributes(self, info, full_names, min_interval=None,
+                                 max_interval=None, delta=False,
+                                 keyframe_interval=KEYFRAME_INTERVAL):
+        """ Setup attribute subscriibtion and return an async gen
+
+        :param min_interval: Minimum time in seconds between two frames of
+                             the same attribute. The latest value is sent
+                             at the end of the interval.
+        :type min_interval: float
+
+        :param max_interval: Maximum time in seconds without a frame for an
+                             attribute. Its last value is sent again.
+        :type max_interval: float
+
+        :param delta: Send only the changed elements of array values, in
+                      `changes`, except in keyframes.
+        :type delta: bool
+
+        :param keyframe_interval: Number of frames of an attribute between
+                                  two keyframes with its full value.
+        :type keyframe_interval: int
+        """
+        deltas = _get_deltas(info, delta, keyframe_interval)
+        send_window = _get_send_window(info)
+        async with subs.attribute_reads(
+            full_names, min_interval=min_interval, max_interval=max_interval
+        ) as attribute_reads:
+            while True:
+                # Leave the reads in the queue until the client keeps up
+                if send_window is not None:
+                    await send_window.acquire()
+                device, read = await _get_read(attribute_reads)
+                try:
+                    yield _make_frame(device, read, attribute_reads, deltas)
+                except Exception as e:
+                    traceback.print_exc()
+                    raise e
+
+    async def resolve_attribute_batches(self, info, full_names,
+                                        window=BATCH_WINDOW,
+                                        min_interval=None, max_interval=None,
+                                        delta=False,
+                                        keyframe_interval=KEYFRAME_INTERVAL):
+        """ Setup attribute subscription and return an async gen yielding
+        lists of frames
+
+        The frames received during `window` seconds after the first one
+        are sent together in one message.
 
-    async def resolve_attributes(self, info, full_names):
-        """ Setup attribute subscriibtion and return an async gen """
-        async with subs.attribute_reads(full_names) as attribute_reads:
-            async for device, read in attribute_reads:
+        :param window: Time in seconds to collect frames for one message.
+        :type window: float
+        """
+        deltas = _get_deltas(info, delta, keyframe_interval)
+        loop = asyncio.get_event_loop()
+        send_window = _get_send_window(info)
+        async with subs.attribute_reads(
+            full_names, min_interval=min_interval, max_interval=max_interval
+        ) as attribute_reads:
+            while True:
+                if send_window is not None:
+                    await send_window.acquire()
+                reads = [await _get_read(attribute_reads)]
+                end = loop.time() + window
+                while True:
+                    remaining = end - loop.time()
+                    if remaining <= 0:
+                        break
+                    read = await _get_read(attribute_reads, remaining)
+                    if read is None:
+                        break
+                    reads.append(read)
                 try:
-                    sec = read.time.tv_sec
-                    micro = read.time.tv_usec
-                    timestamp = sec + micro * 1e-6
-                    value = read.value
-                    write_value = read.w_value
-                    quality = read.quality.name
-                    yield AttributeFrame(
-                        device=device,
-                        attribute=read.name,
-                        value=value,
-                        write_value=write_value,
-                        quality=quality,
-                        timestamp=timestamp,
-                    )
+                    yield [_make_frame(device, read, attribute_reads, deltas)
+                           for device, read in reads]
                 except Exception as e:
                     traceback.print_exc()
                     raise e
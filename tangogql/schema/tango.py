@@ -5,6 +5,9 @@
 import os
 import graphene
 
+from tangogql.backend import CachedBackend
+from tangogql.persistedqueries import PersistedQueries
+from tangogql.resultcache import ResultCache
 from tangogql.schema.query import Query
 from tangogql.schema.subscription import Subscription
 from tangogql.schema.mutations import Mutations
@@ -16,6 +19,12 @@ from tangogql.schema.log import (
 )
 
 MODE = bool(os.environ.get("READ_ONLY"))
+# Number of parsed and validated queries kept
+DOCUMENT_CACHE_SIZE = int(os.environ.get("DOCUMENT_CACHE_SIZE", 1000))
+# Number of persisted queries kept
+PERSISTED_QUERIES_SIZE = int(os.environ.get("PERSISTED_QUERIES_SIZE", 1000))
+# For how long query results are shared between clients, 0 to disable
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", 0))
 
 if MODE == True:
     mutation = None
@@ -32,3 +41,7 @@ types = [
 tangoschema = graphene.Schema(
     query=Query, mutation=mutation, subscription=Subscription, types=types
 )
+
+backend = CachedBackend(maxsize=DOCUMENT_CACHE_SIZE)
+persisted_queries = PersistedQueries(maxsize=PERSISTED_QUERIES_SIZE)
+result_cache = ResultCache(RESULT_CACHE_TTL) if RESULT_CACHE_TTL > 0 else None
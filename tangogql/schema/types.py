@@ -1,10 +1,21 @@
 """Module containing the different types."""
 
 import math
-from graphene import String
+import numpy as np
+from graphene import String, Int
+from tangogql.arrays import to_builtin
 from graphene.types import Scalar
 from graphql.language import ast
 
+def value_arguments():
+    """Arguments of the fields returning attribute values.
+
+    See tangogql.arrays for their meaning.
+    """
+    return dict(encoding=String(), start=Int(), stop=Int(), step=Int(),
+                points=Int(), downsample=String())
+
+
 class ScalarTypes(Scalar):
     """
     This class makes it possible to have input and output of different types.
@@ -21,6 +32,12 @@ class ScalarTypes(Scalar):
 
         :return: Value (any)
         """
+        # Numeric arrays are kept, to be serialized from their buffer;
+        # other NumPy arrays and scalars become lists and Python scalars
+        if (isinstance(value, np.ndarray) and value.ndim
+                and value.dtype.kind in "iuf"):
+            return value
+        value = to_builtin(value)
         # value of type DevState should return as string
         if type(value).__name__ == "DevState":
             return str(value)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+"""
+JSON serialization of responses and websocket messages
+
+Uses orjson when it is installed, else the standard library json module.
+Both write NumPy arrays and scalars, datetimes and dates, and return
+UTF-8 encoded bytes. orjson writes NaN and infinities as null where json
+writes NaN and Infinity.
+"""
+
+__all__ = ['dumps']
+
+import datetime
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    """ Serialize the types json does not know about """
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} "
+                    f"is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(obj):
+        """ Serialize obj to JSON bytes """
+        # orjson's own numpy support misreads non native byte orders
+        return orjson.dumps(obj, default=_default)
+else:
+    def dumps(obj):
+        """ Serialize obj to JSON bytes """
+        return json.dumps(obj, default=_default).encode("utf-8")
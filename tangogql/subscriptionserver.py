@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+"""
+The graphql-ws server handling the /socket endpoint.
+"""
+
+import asyncio
+from inspect import isawaitable
+
+from graphql_ws.aiohttp import AiohttpSubscriptionServer
+from graphql_ws.constants import GQL_COMPLETE, GQL_DATA, GQL_START
+
+from tangogql import packing
+from tangogql.persistedqueries import PersistedQueryError
+from tangogql.serializer import dumps
+
+__all__ = ['SubscriptionServer', 'PROTOCOL', 'MSGPACK_PROTOCOL', 'PROTOCOLS']
+
+PROTOCOL = "graphql-ws"
+# Same messages, sent by the server as binary MessagePack frames
+MSGPACK_PROTOCOL = "graphql-ws-msgpack"
+# Subprotocols offered to the clients, the preferred one first
+PROTOCOLS = (PROTOCOL, MSGPACK_PROTOCOL) if packing.available else (PROTOCOL,)
+
+
+class SubscriptionServer(AiohttpSubscriptionServer):
+    """A graphql-ws server with flow control.
+
+    Every operation gets its own copy of the connection's request context,
+    with a "send_window" semaphore. A subscription acquires it before
+    producing a frame and the server releases it once the frame has been
+    written to the socket, so at most `window` frames per subscription
+    are waiting to be sent. When a client reads slowly, new values stay
+    in the bounded attribute listener queues, where they are conflated,
+    instead of piling up as unsent frames.
+
+    Queries are executed with `backend`, the default GraphQL backend if
+    None, and may be given by hash when `persisted_queries` is set.
+    Messages are serialized by :mod:`tangogql.serializer`. Clients
+    negotiating the MSGPACK_PROTOCOL subprotocol receive them encoded by
+    :mod:`tangogql.packing` in binary frames instead. Their own messages
+    are still JSON text.
+    """
+
+    def __init__(self, schema, window=16, backend=None,
+                 persisted_queries=None, **kwargs):
+        super().__init__(schema, **kwargs)
+        self.window = window
+        self.backend = backend
+        self.persisted_queries = persisted_queries
+
+    def process_message(self, connection_context, parsed_message):
+        payload = parsed_message.get('payload')
+        if (parsed_message.get('type') == GQL_START
+                and self.persisted_queries is not None
+                and isinstance(payload, dict)):
+            op_id = parsed_message.get('id')
+            try:
+                query = self.persisted_queries.get_query(payload)
+            except PersistedQueryError as error:
+                return self._send_persisted_query_error(
+                    connection_context, op_id, error)
+            parsed_message = dict(
+                parsed_message, payload=dict(payload, query=query))
+        return super().process_message(connection_context, parsed_message)
+
+    async def _send_persisted_query_error(self, connection_context, op_id,
+                                          error):
+        await self.send_message(connection_context, op_id, GQL_DATA,
+                                {"errors": [error.to_dict()]})
+        await self.send_message(connection_context, op_id, GQL_COMPLETE)
+
+    def get_graphql_params(self, connection_context, payload):
+        params = super().get_graphql_params(connection_context, payload)
+        context = dict(connection_context.request_context or {})
+        context["send_window"] = asyncio.Semaphore(self.window)
+        return dict(params, context_value=context, backend=self.backend)
+
+    def send_message(self, connection_context, op_id=None, op_type=None,
+                     payload=None):
+        message = self.build_message(op_id, op_type, payload)
+        assert message, "You need to send at least one thing"
+        if connection_context.ws.ws_protocol != MSGPACK_PROTOCOL:
+            return connection_context.send(dumps(message).decode("utf-8"))
+        return self._send_bytes(connection_context, packing.dumps(message))
+
+    async def _send_bytes(self, connection_context, data):
+        if connection_context.closed:
+            return
+        await connection_context.ws.send_bytes(data)
+
+    async def on_start(self, connection_context, op_id, params):
+        window = params["context_value"]["send_window"]
+        execution_result = self.execute(
+            connection_context.request_context, params)
+
+        if isawaitable(execution_result):
+            execution_result = await execution_result
+
+        if not hasattr(execution_result, '__aiter__'):
+            await self.send_execution_result(
+                connection_context, op_id, execution_result)
+        else:
+            iterator = await execution_result.__aiter__()
+            connection_context.register_operation(op_id, iterator)
+            async for single_result in iterator:
+                if not connection_context.has_operation(op_id):
+                    break
+                await self.send_execution_result(
+                    connection_context, op_id, single_result)
+                window.release()
+            await self.send_message(connection_context, op_id, GQL_COMPLETE)
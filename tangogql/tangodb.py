@@ -4,36 +4,121 @@
 A simple caching layer on top of a TANGO database.
 """
 
+import asyncio
+import logging
+import re
+import time
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from weakref import WeakValueDictionary
 
-from tango import Database, DeviceProxy, GreenMode
+from tango import DeviceProxy, DevFailed, GreenMode
 
-from tangogql.ttldict import TTLDict
+from tangogql.aioattribute import ReadError
+from tangogql.ttlcache import TTLCache
+
+logger = logging.getLogger('logger')
+
+
+class DatabaseTimeoutError(Exception):
+    def __init__(self, method, timeout):
+        super().__init__(f"Database call {method} timed out after {timeout} s")
+
+
+class AsyncDatabase(object):
+    """A TANGO database wrapper running the blocking calls in threads.
+
+    Every method of the wrapped database becomes a coroutine function that
+    runs the call in a pool of `max_workers` threads, so that the event
+    loop is free while the database answers. Calls taking more than
+    `timeout` seconds, including the time spent waiting for a free thread,
+    raise a DatabaseTimeoutError. The blocking call itself cannot be
+    interrupted: its thread stays busy until the database answers, so
+    calls that timed out still take up a place in the pool meanwhile.
+    """
+
+    def __init__(self, db, max_workers=4, timeout=10):
+        self._db = db
+        self._timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __getattr__(self, method):
+        return partial(self._call, method)
+
+    async def _call(self, method, *args):
+        loop = asyncio.get_event_loop()
+        func = partial(getattr(self._db, method), *args)
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._executor, func), self._timeout)
+        except asyncio.TimeoutError:
+            raise DatabaseTimeoutError(method, self._timeout)
 
 
 class CachedMethod(object):
-    """A cached wrapper for a DB method."""
+    """A cached wrapper for an asynchronous DB method.
+
+    At most `maxsize` argument tuples are remembered, the least recently
+    used ones are dropped first. Concurrent calls with the same arguments
+    that miss the cache share a single call to the method.
+
+    With a `stale_ttl`, values older than `ttl` are still returned for
+    `stale_ttl` more seconds, while the method is called again in the
+    background to refresh them.
+    """
 
-    def __init__(self, method, ttl=10):
-        self.cache = TTLDict(default_ttl=ttl)
+    def __init__(self, method, ttl=10, maxsize=1000, stale_ttl=0):
+        # The entries are (fresh until, value)
+        self.cache = TTLCache(ttl=ttl + stale_ttl, maxsize=maxsize)
         self.method = method
+        self.ttl = ttl
+        self._calls = {}
+
+    async def __call__(self, *args):
+        entry = self.cache.get(args)
+        if entry is not None:
+            fresh_until, value = entry
+            if fresh_until < time.monotonic():
+                self._call(args)
+            return value
+        return await asyncio.shield(self._call(args))
+
+    def _call(self, args):
+        """Return the pending call for args, starting one if needed."""
+        future = self._calls.get(args)
+        if future is None:
+            future = asyncio.ensure_future(self._load(args))
+            self._calls[args] = future
+            future.add_done_callback(partial(self._call_done, args))
+        return future
 
-    def __call__(self, *args):
-        if args in self.cache:
-            return self.cache[args]
-        value = self.method(*args)
-        self.cache[args] = value
+    async def _load(self, args):
+        value = await self.method(*args)
+        self.cache[args] = (time.monotonic() + self.ttl, value)
         return value
 
+    def _call_done(self, args, future):
+        del self._calls[args]
+        if not future.cancelled():
+            # Nobody may be waiting for a background refresh; consume the
+            # error so that it is not reported as never retrieved.
+            future.exception()
+
 
 class CachedDatabase(object):
-    """A TANGO database wrapper that caches 'get' methods."""
+    """A TANGO database wrapper that caches 'get' methods.
 
-    _db = Database()
-    _methods = {}
+    The wrapped database is expected to be an AsyncDatabase, so all methods
+    are coroutine functions.
+    """
 
-    def __init__(self, ttl):
+    def __init__(self, db, ttl, maxsize=1000, stale_ttl=0):
+        self._db = db
         self._ttl = ttl
+        self._maxsize = maxsize
+        self._stale_ttl = stale_ttl
+        self._methods = {}
 
     def __getattr__(self, method):
         if not method.startswith("get_"):
@@ -42,9 +127,16 @@ class CachedDatabase(object):
             return getattr(self._db, method)
         if method not in self._methods:
             self._methods[method] = CachedMethod(getattr(self._db, method),
-                                                 ttl=self._ttl)
+                                                 ttl=self._ttl,
+                                                 maxsize=self._maxsize,
+                                                 stale_ttl=self._stale_ttl)
         return self._methods[method]
 
+    def stats(self):
+        """Return the cache counters of each cached method."""
+        return {name: method.cache.stats()
+                for name, method in self._methods.items()}
+
 
 class DeviceProxyCache(object):
     """Keep a limited cache of device proxies that are reused."""
@@ -68,3 +160,391 @@ class DeviceProxyCache(object):
             self._device_proxies.popitem(last=False)
         self._device_proxies[devname] = proxy
         return proxy
+
+
+class DeviceCalls(object):
+    """Run blocking device proxy calls in threads, so that calls to many
+    devices proceed in parallel.
+
+    At most `limit` calls run at a time, and at most `host_limit` of them
+    on devices served from the same host, so one busy host does not use
+    up all the threads. The host of a device is looked up in the database
+    in the background, and remembered for `host_ttl` seconds; calls to a
+    device whose host is not known yet only count towards `limit`.
+    """
+
+    def __init__(self, proxies, db, limit=16, host_limit=4, host_ttl=600):
+        self.proxies = proxies
+        self.db = db
+        self.host_limit = host_limit
+        self.executor = ThreadPoolExecutor(max_workers=limit)
+        self.semaphore = asyncio.Semaphore(limit)
+        # device -> host, None when it could not be found
+        self._device_hosts = TTLCache(ttl=host_ttl, maxsize=10000)
+        self._lookups = {}
+        # host -> semaphore, dropped once no call uses it
+        self._hosts = WeakValueDictionary()
+
+    async def call(self, device, method, *args):
+        """Return the result of proxy.method(*args) for a device"""
+        host = self._get_host(device)
+        if host is None:
+            return await self._call(device, method, args)
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.host_limit)
+        # Wait for the host first, not to hold a slot meanwhile
+        async with semaphore:
+            return await self._call(device, method, args)
+
+    async def _call(self, device, method, args):
+        loop = asyncio.get_event_loop()
+        async with self.semaphore:
+            proxy = self.proxies.get(device)
+            return await loop.run_in_executor(
+                self.executor, partial(getattr(proxy, method), *args))
+
+    def _get_host(self, device):
+        """Return the host of a device if known, else start looking it
+        up for the next calls and return None"""
+        key = device.lower()
+        host = self._device_hosts.get(key)
+        if (host is None and key not in self._device_hosts
+                and key not in self._lookups):
+            future = asyncio.ensure_future(self._lookup_host(device, key))
+            self._lookups[key] = future
+            future.add_done_callback(partial(self._lookup_done, key))
+        return host
+
+    async def _lookup_host(self, device, key):
+        try:
+            info = await self.db.get_device_info(device)
+        except Exception:
+            # The calls will report what is wrong with the device
+            host = None
+        else:
+            host = getattr(info, "host", None)
+        self._device_hosts[key] = host
+
+    def _lookup_done(self, key, future):
+        del self._lookups[key]
+
+
+class AttributeInfoCache(object):
+    """Keep the configuration of device attributes for a limited time.
+
+    The configuration of all attributes of a device is fetched with a
+    single attribute_list_query_ex call, run through `device_calls` and
+    shared by the requests waiting for it. Entries expire after `ttl`
+    seconds, and are replaced or dropped when attribute configuration
+    events are received.
+    """
+
+    def __init__(self, device_calls, ttl=60, maxsize=10000):
+        self._device_calls = device_calls
+        self._infos = TTLCache(ttl=ttl, maxsize=maxsize)
+        self._loads = {}
+
+    def update(self, device, attr_infos):
+        """Store the configuration of attributes of a device."""
+        for attr_info in attr_infos:
+            self._infos[_attr_key(device, attr_info.name)] = attr_info
+
+    def invalidate(self, device, name):
+        """Forget the configuration of an attribute."""
+        self._infos.pop(_attr_key(device, name), None)
+
+    async def get(self, device, name):
+        """Return the configuration of an attribute."""
+        key = _attr_key(device, name)
+        attr_info = self._infos.get(key)
+        if attr_info is not None:
+            return attr_info
+        await self._load(device)
+        attr_info = self._infos.get(key)
+        if attr_info is None:
+            # Not listed by the device; let attribute_query raise the
+            # appropriate error or find it anyway.
+            attr_info = await self._device_calls.call(
+                device, "attribute_query", name)
+            self._infos[key] = attr_info
+        return attr_info
+
+    async def _load(self, device):
+        """Fetch the configuration of all attributes of a device, once
+        for all the requests waiting for it"""
+        key = device.lower()
+        if key not in self._loads:
+            future = asyncio.ensure_future(self._fetch(device))
+            self._loads[key] = future
+            future.add_done_callback(partial(self._load_done, key))
+        await asyncio.shield(self._loads[key])
+
+    async def _fetch(self, device):
+        attr_infos = await self._device_calls.call(
+            device, "attribute_list_query_ex")
+        self.update(device, attr_infos)
+
+    def _load_done(self, key, future):
+        del self._loads[key]
+        if not future.cancelled():
+            # The waiters get the exception, if any
+            future.exception()
+
+    def on_config_event(self, device, event):
+        """Handle an attribute configuration event for `device`."""
+        if event.err or event.attr_conf is None:
+            self.invalidate(device, event.attr_name.split("/")[-1])
+        else:
+            self.update(device, [event.attr_conf])
+
+
+def _attr_key(device, name):
+    # Tango names are case insensitive
+    return (device.lower(), name.lower())
+
+
+class DeviceStateCache(object):
+    """Device states shared by all requests.
+
+    A device whose state is asked for gets its State attribute
+    subscribed through the subscription manager, so change events, or
+    else periodic events or grouped polling, keep its state up to date.
+    Until the subscription delivers a state, or after it reports an
+    error, a state older than `max_age` seconds is read again from the
+    device, once for all the requests waiting for it; failed reads are
+    cached as well. Devices not asked for during `linger` seconds are no
+    longer followed.
+    """
+
+    def __init__(self, proxies, subscriptions, max_age=2, linger=60):
+        self.proxies = proxies
+        self.subscriptions = subscriptions
+        self.max_age = max_age
+        self.linger = linger
+        # device -> (time, state, error)
+        self._states = {}
+        # device -> time it was last asked for
+        self._used = {}
+        self._watchers = {}
+        # Devices whose state is kept up to date by their watcher
+        self._live = set()
+        self._reads = {}
+        self._last_sweep = 0
+
+    async def get(self, device):
+        """Return the state of a device, or raise the DevFailed of the
+        last attempt to get it."""
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        key = device.lower()
+        self._used[key] = now
+        self._sweep(now)
+        if key not in self._watchers:
+            self._watchers[key] = asyncio.ensure_future(
+                self._watch(device, key))
+        entry = self._states.get(key)
+        if entry is None or (key not in self._live
+                             and now - entry[0] > self.max_age):
+            if key not in self._reads:
+                future = asyncio.ensure_future(self._read(device, key))
+                self._reads[key] = future
+                future.add_done_callback(partial(self._read_done, key))
+            entry = await asyncio.shield(self._reads[key])
+        _time, state, error = entry
+        if error is not None:
+            raise error
+        return state
+
+    async def _read(self, device, key):
+        try:
+            state = await self.proxies.get(device).state()
+            entry = (asyncio.get_event_loop().time(), state, None)
+        except DevFailed as error:
+            entry = (asyncio.get_event_loop().time(), None, error)
+        self._states[key] = entry
+        return entry
+
+    def _read_done(self, key, future):
+        del self._reads[key]
+        if not future.cancelled():
+            # The waiters get the exception, if any
+            future.exception()
+
+    async def _watch(self, device, key):
+        """Follow the State attribute of a device"""
+        loop = asyncio.get_event_loop()
+        try:
+            async with self.subscriptions.attribute_reads(
+                [f"{device}/State"], background=True
+            ) as reads:
+                while True:
+                    _device, read = await reads.get()
+                    if isinstance(read, ReadError):
+                        # Read from the device until the events are back
+                        self._live.discard(key)
+                        continue
+                    self._states[key] = (loop.time(), read.value, None)
+                    self._live.add(key)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Kept in the watchers until swept, so it is not retried
+            # at every request
+            logger.exception(f"Failed to follow the state of {device}")
+        finally:
+            self._live.discard(key)
+
+    def _sweep(self, now):
+        """Stop following the devices nobody asked for lately"""
+        if now - self._last_sweep < self.linger / 2:
+            return
+        self._last_sweep = now
+        for key, used in list(self._used.items()):
+            if now - used > self.linger:
+                del self._used[key]
+                self._states.pop(key, None)
+                self._live.discard(key)
+                watcher = self._watchers.pop(key, None)
+                if watcher is not None:
+                    watcher.cancel()
+
+
+class DeviceIndex(object):
+    """An in-memory index of the device names in the TANGO database.
+
+    The names are kept in a tree of domain, family and member, so that the
+    queries for each level of the tree are answered without asking the
+    database. The index is loaded on first use and then refreshed every
+    `interval` seconds in the background, applying only the differences
+    with the previous list of names.
+    """
+
+    def __init__(self, db, interval=10):
+        self._db = db
+        self._interval = interval
+        self._root = _IndexNode(None)
+        self._names = {}
+        self._exported = set()
+        self._loaded = None
+        self._task = None
+
+    async def get_domains(self, pattern="*"):
+        """Return the domains matching pattern."""
+        await self._load()
+        return _names(_children([self._root], pattern))
+
+    async def get_families(self, domain="*", pattern="*"):
+        """Return the families matching pattern in the matching domains."""
+        await self._load()
+        domains = _children([self._root], domain)
+        return _names(_children(domains, pattern))
+
+    async def get_members(self, domain="*", family="*", pattern="*"):
+        """Return the members matching pattern in the matching families."""
+        await self._load()
+        families = _children(_children([self._root], domain), family)
+        return _names(_children(families, pattern))
+
+    async def get_exported(self, pattern="*"):
+        """Return the names of the exported devices matching pattern."""
+        await self._load()
+        parts = pattern.split("/")
+        if len(parts) == 3:
+            nodes = [self._root]
+            for part in parts:
+                nodes = _children(nodes, part)
+            keys = [node.key for node in nodes]
+        else:
+            rule = _compile(pattern)
+            keys = [key for key in self._names if rule.match(key)]
+        return sorted(self._names[key] for key in keys
+                      if key in self._exported)
+
+    async def refresh(self):
+        """Update the index with the current names in the database."""
+        names = await self._db.command_inout("DbGetDeviceWideList", "*")
+        exported = await self._db.get_device_exported("*")
+        self._update(names, exported)
+
+    async def _load(self):
+        if self._task is None:
+            self._loaded = asyncio.get_event_loop().create_future()
+            self._task = asyncio.ensure_future(self._run())
+        await asyncio.shield(self._loaded)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as error:
+                if not self._loaded.done():
+                    # Let the next query try again
+                    self._loaded.set_exception(error)
+                    self._loaded.exception()
+                    self._task = None
+                    return
+                logger.warning(f"Failed to refresh the device index: {error}")
+            else:
+                if not self._loaded.done():
+                    self._loaded.set_result(None)
+            await asyncio.sleep(self._interval)
+
+    def _update(self, names, exported):
+        names = {name.lower(): name for name in names
+                 if name.count("/") == 2}
+        for key in self._names.keys() - names.keys():
+            self._remove(key)
+        for key in names.keys() - self._names.keys():
+            self._add(key, names[key])
+        self._exported = {name.lower() for name in exported}
+
+    def _add(self, key, name):
+        node = self._root
+        for part in name.split("/"):
+            node = node.children.setdefault(part.lower(), _IndexNode(part))
+        node.key = key
+        self._names[key] = name
+
+    def _remove(self, key):
+        path = [self._root]
+        for part in key.split("/"):
+            path.append(path[-1].children[part])
+        for parent, node in zip(reversed(path[:-1]), reversed(path[1:])):
+            if node.children:
+                break
+            del parent.children[node.name.lower()]
+        del self._names[key]
+
+
+class _IndexNode(object):
+    __slots__ = ("name", "key", "children")
+
+    def __init__(self, name):
+        self.name = name
+        self.key = None
+        self.children = {}
+
+
+@lru_cache(maxsize=1024)
+def _compile(pattern):
+    """Compile a TANGO database wildcard, where only * is special."""
+    parts = (re.escape(part) for part in pattern.split("*"))
+    return re.compile(".*".join(parts) + r"\Z", re.IGNORECASE | re.DOTALL)
+
+
+def _children(nodes, pattern):
+    """Return the children of nodes whose name match pattern."""
+    if pattern == "*":
+        return [child for node in nodes for child in node.children.values()]
+    rule = _compile(pattern)
+    return [child for node in nodes for child in node.children.values()
+            if rule.match(child.name)]
+
+
+def _names(nodes):
+    """Return the sorted names of nodes, without case insensitive duplicates."""
+    names = {}
+    for node in nodes:
+        names.setdefault(node.name.lower(), node.name)
+    return sorted(names.values())
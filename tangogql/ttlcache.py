@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+"""
+Size bounded cache with expiring entries
+
+Tricks / features:
+ - least recently used entries are evicted when the cache is full
+ - all entries share the same TTL, so the expiry order is the order in
+   which entries were set and expired entries are dropped lazily from the
+   front of that order, in amortized O(1)
+ - no locking, only meant to be used from the event loop
+ - counts hits, misses, evictions and expirations
+"""
+
+__all__ = ['TTLCache']
+
+from collections import OrderedDict
+import time
+
+_MISSING = object()
+
+
+class TTLCache(object):
+    """
+    Mapping keeping at most `maxsize` entries for `ttl` seconds.
+    A `ttl` of None means that entries never expire.
+    """
+
+    def __init__(self, ttl=None, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # key -> (expire, value), in least recently used order
+        self._values = OrderedDict()
+        # key -> expire, in the order the keys were set
+        self._expires = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __repr__(self):
+        return '<TTLCache@%#08x; ttl=%r, maxsize=%r, size=%r>' % (
+            id(self), self.ttl, self.maxsize, len(self._values))
+
+    def _expire(self, now):
+        """ Drop the entries that have expired by `now` """
+        expires = self._expires
+        while expires:
+            key, expire = next(iter(expires.items()))
+            if expire > now:
+                break
+            del expires[key]
+            del self._values[key]
+            self.expirations += 1
+
+    def get(self, key, default=None):
+        """ Return the value for key, or default if missing or expired """
+        if self.ttl is not None:
+            self._expire(time.monotonic())
+        entry = self._values.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        self._values.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if self.ttl is None:
+            expire = None
+        else:
+            now = time.monotonic()
+            self._expire(now)
+            expire = now + self.ttl
+            self._expires.pop(key, None)
+            self._expires[key] = expire
+        self._values.pop(key, None)
+        self._values[key] = (expire, value)
+        while len(self._values) > self.maxsize:
+            oldest, _entry = self._values.popitem(last=False)
+            self._expires.pop(oldest, None)
+            self.evictions += 1
+
+    def __delitem__(self, key):
+        del self._values[key]
+        self._expires.pop(key, None)
+
+    def pop(self, key, default=_MISSING):
+        """ Remove key and return its value """
+        try:
+            _expire, value = self._values.pop(key)
+        except KeyError:
+            if default is _MISSING:
+                raise
+            return default
+        self._expires.pop(key, None)
+        return value
+
+    def __contains__(self, key):
+        """ Check for key without counting a hit or a miss """
+        entry = self._values.get(key, _MISSING)
+        if entry is _MISSING:
+            return False
+        return entry[0] is None or entry[0] > time.monotonic()
+
+    def keys(self):
+        """ Return a list of the keys that have not expired """
+        if self.ttl is not None:
+            self._expire(time.monotonic())
+        return list(self._values)
+
+    def items(self):
+        """ Return a list of the (key, value) pairs that have not expired,
+        without counting hits nor changing the LRU order """
+        if self.ttl is not None:
+            self._expire(time.monotonic())
+        return [(key, entry[1]) for key, entry in self._values.items()]
+
+    def __len__(self):
+        if self.ttl is not None:
+            self._expire(time.monotonic())
+        return len(self._values)
+
+    def clear(self):
+        """ Remove all entries, keeping the counters """
+        self._values.clear()
+        self._expires.clear()
+
+    def stats(self):
+        """ Return the counters and the current size """
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
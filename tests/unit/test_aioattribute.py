@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+
+"""Unit tests for the subscription manager, without a TANGO host."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from tango import DevFailed
+
+from tangogql import ttlcache
+from tangogql.aioattribute import manager
+from tangogql.aioattribute import attribute as attribute_module
+from tangogql.aioattribute.attribute import Attribute, ReadError
+from tangogql.aioattribute.manager import AttributeReads
+from tangogql.aioattribute.polling import PollingScheduler
+from tangogql.aioattribute.queue import ConflatingQueue
+
+__docformat__ = "restructuredtext"
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class FakeAttribute(object):
+    """Attribute whose subscription takes `delays[device]` seconds"""
+
+    delays = {}
+    subscriptions = 0
+
+    def __init__(self, name, **kwargs):
+        self.name = name
+        self.device = name.rsplit("/", 1)[0]
+        self.listeners = []
+        self.subscribed = False
+        self.mechanism = "change"
+
+    async def add_listener(self, listener):
+        if not self.subscribed:
+            await asyncio.sleep(self.delays.get(self.device, 0))
+            self.subscribed = True
+            FakeAttribute.subscriptions += 1
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def close(self):
+        self.subscribed = False
+
+
+@pytest.fixture
+def subscriptions(monkeypatch):
+    monkeypatch.setattr(manager, "Attribute", FakeAttribute)
+    FakeAttribute.delays = {}
+    FakeAttribute.subscriptions = 0
+    return manager.SubscriptionManager(concurrency=2, linger=0)
+
+
+async def subscribe_async(subscriptions, name):
+    async with subscriptions.attribute_reads([name]):
+        return subscriptions.attributes[name]
+
+
+def subscribe(subscriptions, name):
+    """Subscribe to an attribute and leave, returning the Attribute"""
+    return run(subscribe_async(subscriptions, name))
+
+
+def test_fast_device_not_delayed_by_slow_device(subscriptions):
+    FakeAttribute.delays = {"slow/dev/1": 0.2}
+
+    async def subscribe(names):
+        async with subscriptions.attribute_reads(names):
+            pass
+
+    async def main():
+        loop = asyncio.get_event_loop()
+        # Many clients queued on the slow device
+        slow = [asyncio.ensure_future(subscribe([f"slow/dev/1/attr{i}"]))
+                for i in range(10)]
+        await asyncio.sleep(0.01)
+        start = loop.time()
+        await subscribe(["fast/dev/1/attr"])
+        elapsed = loop.time() - start
+        await asyncio.gather(*slow)
+        return elapsed
+
+    assert run(main()) < 0.1
+
+
+def test_listener_removed_from_every_attribute_on_failure(subscriptions):
+    async def failing_add_listener(self, listener):
+        raise RuntimeError("subscription failed")
+
+    async def main():
+        attribute = subscriptions._get_attribute("bad/dev/1/attr")
+        attribute.add_listener = failing_add_listener.__get__(attribute)
+        with pytest.raises(RuntimeError):
+            async with subscriptions.attribute_reads(
+                ["good/dev/1/attr", "bad/dev/1/attr"]
+            ):
+                pass
+
+    run(main())
+    assert all(not attribute.listeners
+               for attribute in subscriptions.attributes.values())
+
+
+def test_background_subscriptions_do_not_delay_clients(subscriptions):
+    FakeAttribute.delays = {f"slow/dev/{i}": 0.2 for i in range(10)}
+
+    async def subscribe(names, background=False):
+        async with subscriptions.attribute_reads(
+            names, background=background
+        ):
+            pass
+
+    async def main():
+        loop = asyncio.get_event_loop()
+        background = asyncio.ensure_future(subscribe(
+            [f"slow/dev/{i}/State" for i in range(10)], background=True))
+        await asyncio.sleep(0.01)
+        start = loop.time()
+        await subscribe(["fast/dev/1/attr"])
+        elapsed = loop.time() - start
+        await background
+        return elapsed
+
+    assert run(main()) < 0.1
+
+
+def test_error_events_passed_to_listeners():
+    attribute = Attribute("sys/tg_test/1/ampli")
+    listener = asyncio.Queue()
+    attribute.listeners.append(listener)
+    errors = (SimpleNamespace(reason="API_EventTimeout"),)
+    attribute._on_event(SimpleNamespace(event="change", err=True,
+                                        errors=errors, attr_value=None))
+    device, read = listener.get_nowait()
+    assert device == "sys/tg_test/1"
+    assert isinstance(read, ReadError)
+    assert read.name == "ampli"
+    assert read.errors == errors
+    assert attribute.last_read is read
+
+
+def item(attribute, value):
+    return ("sys/tg_test/1", SimpleNamespace(name=attribute, value=value))
+
+
+def values(queue):
+    result = []
+    while not queue.empty():
+        _device, read = queue.get_nowait()
+        queue.task_done()
+        result.append((read.name, read.value))
+    return result
+
+
+def test_queue_conflates_pending_read_in_place():
+    queue = ConflatingQueue(2)
+    queue.put_nowait(item("a", 1))
+    queue.put_nowait(item("b", 1))
+    queue.put_nowait(item("a", 2))
+    # The read of "a" keeps its place in the queue
+    assert values(queue) == [("a", 2), ("b", 1)]
+    assert (queue.conflated, queue.dropped) == (1, 0)
+
+
+def test_queue_discards_superseded_read_first():
+    queue = ConflatingQueue(3)
+    queue.put_nowait(item("a", 1))
+    queue.put_nowait(item("b", 1))
+    queue.get_nowait()
+    queue.task_done()
+    queue.put_nowait(item("b", 2))
+    queue.put_nowait(item("a", 2))
+    queue.put_nowait(item("c", 1))
+    assert values(queue) == [("b", 2), ("a", 2), ("c", 1)]
+    assert (queue.conflated, queue.dropped) == (1, 0)
+
+
+def test_queue_drops_oldest_read():
+    queue = ConflatingQueue(2)
+    for name in "abc":
+        queue.put_nowait(item(name, 1))
+    assert values(queue) == [("b", 1), ("c", 1)]
+    assert (queue.conflated, queue.dropped) == (0, 1)
+
+
+def test_queue_joins_after_discards():
+    queue = ConflatingQueue(2)
+    for value in range(3):
+        queue.put_nowait(item("a", value))
+    for name in "bcd":
+        queue.put_nowait(item(name, 1))
+    values(queue)
+    # Every put was either consumed or accounted for by the discards
+    run(asyncio.wait_for(queue.join(), 1))
+
+
+def timed(reads, timeout=None):
+    """Return the value of the next read and how long it took"""
+    async def get():
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        item = await reads.get(timeout)
+        value = None if item is None else item[1].value
+        return value, loop.time() - start
+    return run(get())
+
+
+def test_reads_min_interval_sends_latest_held_read():
+    queue = ConflatingQueue(10)
+    reads = AttributeReads(queue, min_interval=0.1)
+    queue.put_nowait(item("a", 1))
+    assert timed(reads)[0] == 1
+    queue.put_nowait(item("a", 2))
+    queue.put_nowait(item("b", 1))
+    queue.put_nowait(item("a", 3))
+    # Other attributes are not held back
+    value, elapsed = timed(reads)
+    assert value == 1 and elapsed < 0.05
+    value, elapsed = timed(reads)
+    assert value == 3 and 0.05 < elapsed < 0.2
+    reads.close()
+
+
+def test_reads_max_interval_repeats_last_read():
+    queue = ConflatingQueue(10)
+    reads = AttributeReads(queue, max_interval=0.1)
+    queue.put_nowait(item("a", 1))
+    assert timed(reads)[0] == 1
+    value, elapsed = timed(reads)
+    assert value == 1 and 0.05 < elapsed < 0.2
+    reads.close()
+
+
+def test_reads_timeout_loses_nothing():
+    queue = ConflatingQueue(10)
+    reads = AttributeReads(queue)
+    value, elapsed = timed(reads, timeout=0.05)
+    assert value is None and elapsed >= 0.04
+    queue.put_nowait(item("a", 1))
+    assert timed(reads, timeout=0.05)[0] == 1
+    reads.close()
+
+
+class EventProxy(object):
+    """Device proxy whose events work only when `events` is set"""
+
+    events = False
+    subscriptions = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def subscribe_event(self, *args, **kwargs):
+        EventProxy.subscriptions += 1
+        if not EventProxy.events:
+            raise DevFailed()
+        return 1
+
+    def unsubscribe_event(self, event_id):
+        pass
+
+
+class FakeScheduler(object):
+
+    def add(self, attribute):
+        pass
+
+    def remove(self, attribute):
+        pass
+
+
+def test_polling_fallback_expires(monkeypatch):
+    monkeypatch.setattr(attribute_module, "DeviceProxy", EventProxy)
+    monkeypatch.setattr(ttlcache, "time", SimpleNamespace(monotonic=None))
+    EventProxy.events = False
+    subscriptions = manager.SubscriptionManager(linger=0, mechanism_ttl=600)
+    subscriptions.scheduler = FakeScheduler()
+
+    def subscribe(now):
+        ttlcache.time.monotonic = lambda: now
+
+        async def main():
+            async with subscriptions.attribute_reads(["sys/tg_test/1/a"]):
+                return subscriptions.attributes["sys/tg_test/1/a"].mechanism
+        return run(main())
+
+    assert subscribe(0) == "polling"
+    # Events are not tried again while the fallback is remembered, and
+    # subscribing again does not extend it
+    EventProxy.events = True
+    EventProxy.subscriptions = 0
+    assert subscribe(500) == "polling"
+    assert EventProxy.subscriptions == 0
+    assert subscribe(700) == "change"
+
+
+class PolledProxy(object):
+    """Device proxy whose `bad` attributes cannot be read"""
+
+    def __init__(self, bad=()):
+        self.bad = bad
+        self.calls = []
+
+    def dev_name(self):
+        return "sys/tg_test/1"
+
+    async def read_attribute(self, name, extract_as=None):
+        self.calls.append(("read_attribute", name))
+        if name in self.bad:
+            raise DevFailed(name)
+        return SimpleNamespace(name=name, value=1, has_failed=False)
+
+    async def read_attributes(self, names, extract_as=None):
+        self.calls.append(("read_attributes", tuple(names)))
+        if any(name in self.bad for name in names):
+            raise DevFailed(*names)
+        return [SimpleNamespace(name=name, value=1, has_failed=False)
+                for name in names]
+
+
+class PolledAttribute(object):
+    """Attribute recording what polling notifies"""
+
+    def __init__(self, device_proxy, attr, polling_interval=0.05):
+        self.device = "sys/tg_test/1"
+        self.attr = attr
+        self.device_proxy = device_proxy
+        self.polling_interval = polling_interval
+        self.reads = []
+        self.errors = []
+
+    def _notify_listeners(self, read):
+        self.reads.append(read)
+
+    def _notify_error(self, errors):
+        self.errors.append(errors)
+
+
+def poll(scheduler, attributes, duration=0.03):
+    async def main():
+        for attribute in attributes:
+            scheduler.add(attribute)
+        await asyncio.sleep(duration)
+    run(main())
+
+
+def test_polling_groups_attributes_of_a_device():
+    proxy = PolledProxy()
+    scheduler = PollingScheduler()
+    a, b = PolledAttribute(proxy, "a"), PolledAttribute(proxy, "b")
+    slow = PolledAttribute(proxy, "c", polling_interval=10)
+    poll(scheduler, [a, b, slow])
+    assert len(scheduler.groups) == 2
+    assert ("read_attributes", ("a", "b")) in proxy.calls
+    assert ("read_attributes", ("c",)) in proxy.calls
+    assert a.reads and b.reads and slow.reads
+    for attribute in (a, b, slow):
+        scheduler.remove(attribute)
+
+
+def test_polling_failed_group_read_one_by_one():
+    proxy = PolledProxy(bad=("b",))
+    scheduler = PollingScheduler()
+    a, b = PolledAttribute(proxy, "a"), PolledAttribute(proxy, "b")
+    poll(scheduler, [a, b])
+    assert proxy.calls[:3] == [("read_attributes", ("a", "b")),
+                               ("read_attribute", "a"),
+                               ("read_attribute", "b")]
+    assert a.reads and not a.errors
+    assert b.errors and not b.reads
+    scheduler.remove(a)
+    scheduler.remove(b)
+
+
+def test_polling_stops_with_last_attribute():
+    proxy = PolledProxy()
+    scheduler = PollingScheduler()
+    a, b = PolledAttribute(proxy, "a"), PolledAttribute(proxy, "b")
+    poll(scheduler, [a, b])
+    group = scheduler.groups[("sys/tg_test/1", 0.05)]
+    task = group.polling_task
+    scheduler.remove(a)
+    assert not task.done() and scheduler.groups
+    scheduler.remove(b)
+    run(asyncio.sleep(0))
+    assert task.done()
+    assert group.polling_task is None
+    assert not scheduler.groups
+
+
+def test_lingering_attribute_reused(subscriptions):
+    subscriptions.linger = 10
+    first = subscribe(subscriptions, "sys/tg_test/1/a")
+    assert first.subscribed
+    assert subscribe(subscriptions, "sys/tg_test/1/a") is first
+    assert FakeAttribute.subscriptions == 1
+    assert list(subscriptions.lingering) == ["sys/tg_test/1/a"]
+    subscriptions._close("sys/tg_test/1/a")
+
+
+def test_oldest_lingering_attribute_closed(subscriptions):
+    subscriptions.linger = 10
+    subscriptions.max_lingering = 2
+    attributes = [subscribe(subscriptions, f"sys/tg_test/1/{name}")
+                  for name in "abc"]
+    assert [attribute.subscribed for attribute in attributes] == [
+        False, True, True]
+    assert list(subscriptions.attributes) == ["sys/tg_test/1/b",
+                                              "sys/tg_test/1/c"]
+    assert list(subscriptions.lingering) == ["sys/tg_test/1/b",
+                                             "sys/tg_test/1/c"]
+    for name in list(subscriptions.lingering):
+        subscriptions._close(name)
+
+
+def test_no_linger_closes_at_once(subscriptions):
+    first = subscribe(subscriptions, "sys/tg_test/1/a")
+    assert not first.subscribed
+    assert not subscriptions.attributes and not subscriptions.lingering
+    assert subscribe(subscriptions, "sys/tg_test/1/a") is not first
+    assert FakeAttribute.subscriptions == 2
+
+
+def test_device_locks_dropped_when_unused(subscriptions):
+    FakeAttribute.delays = {"sys/tg_test/1": 0.05}
+
+    async def main():
+        first = asyncio.ensure_future(
+            subscribe_async(subscriptions, "sys/tg_test/1/a"))
+        second = asyncio.ensure_future(
+            subscribe_async(subscriptions, "sys/tg_test/1/b"))
+        await asyncio.sleep(0.01)
+        # Both wait for the same lock
+        assert list(subscriptions.locks) == ["sys/tg_test/1"]
+        await asyncio.gather(first, second)
+
+    run(main())
+    assert not subscriptions.locks
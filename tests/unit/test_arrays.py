@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""Unit tests for the attribute value helpers."""
+
+import numpy as np
+import pytest
+
+from tangogql.arrays import reduce, _minmax
+
+__docformat__ = "restructuredtext"
+
+
+def test_reduce_leaves_scalars():
+    assert reduce(3.5, start=1, points=2) == 3.5
+    assert reduce("text", points=2) == "text"
+
+
+def test_reduce_slices_first_axis():
+    value = np.arange(12).reshape(4, 3)
+    assert reduce(value, start=1, stop=3).tolist() == [[3, 4, 5],
+                                                       [6, 7, 8]]
+    assert reduce(list(range(10)), step=3) == [0, 3, 6, 9]
+
+
+def test_reduce_decimates_each_axis():
+    value = np.arange(100).reshape(10, 10)
+    reduced = reduce(value, points=4)
+    assert reduced.shape == (4, 4)
+    assert reduced[1].tolist() == [30, 33, 36, 39]
+    assert reduce(list(range(10)), points=5) == [0, 2, 4, 6, 8]
+    # Short values are kept
+    assert reduce(np.arange(3), points=5).tolist() == [0, 1, 2]
+
+
+def test_reduce_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        reduce(np.arange(3), points=0)
+    with pytest.raises(ValueError):
+        reduce(np.arange(3), points=2, downsample="average")
+
+
+def test_minmax_keeps_extremes_of_each_bucket():
+    value = np.array([1, 5, 2, 3, -1, 4, 0, 9, 7, 8], dtype=np.int16)
+    reduced = reduce(value, points=4, downsample="minmax")
+    assert reduced.dtype == np.int16
+    assert reduced.tolist() == [-1, 5, 0, 9]
+    # Spikes shorter than a bucket survive
+    value = np.zeros(1000)
+    value[123] = 1
+    assert _minmax(value, 10).max() == 1
+
+
+def test_minmax_keeps_short_spectra():
+    value = np.arange(4.0)
+    assert _minmax(value, 4) is value
+    assert _minmax([1, 2], 10).tolist() == [1, 2]
+
+
+def test_minmax_needs_numeric_spectrum():
+    with pytest.raises(ValueError):
+        _minmax(np.zeros((10, 10)), 4)
+    with pytest.raises(ValueError):
+        _minmax(np.array(["a"] * 10), 4)
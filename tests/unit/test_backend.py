@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""Unit tests for the GraphQL backend caching documents."""
+
+import graphene
+import pytest
+
+from tangogql import backend as backend_module
+from tangogql.backend import CachedBackend
+
+__docformat__ = "restructuredtext"
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String(name=graphene.String())
+
+    def resolve_hello(self, info, name="world"):
+        return f"hello {name}"
+
+
+schema = graphene.Schema(query=Query)
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Query strings parsed by the backend"""
+    parsed = []
+    original = backend_module.parse
+
+    def parse(document_string):
+        parsed.append(document_string)
+        return original(document_string)
+
+    monkeypatch.setattr(backend_module, "parse", parse)
+    return parsed
+
+
+def test_document_parsed_once(parses):
+    backend = CachedBackend()
+    query = '{ hello(name: "tango") }'
+    document = backend.document_from_string(schema, query)
+    assert backend.document_from_string(schema, query) is document
+    assert parses == [query]
+    for _ in range(2):
+        result = schema.execute(query, backend=backend)
+        assert result.data == {"hello": "hello tango"}
+    assert parses == [query]
+    assert backend.stats()["hits"] == 3
+
+
+def test_invalid_document_cached_with_errors(parses):
+    backend = CachedBackend()
+    query = "{ goodbye }"
+    for _ in range(2):
+        result = schema.execute(query, backend=backend)
+        assert result.invalid
+        assert "goodbye" in result.errors[0].message
+    assert parses == [query]
+
+
+def test_syntax_errors_not_cached(parses):
+    backend = CachedBackend()
+    for _ in range(2):
+        result = schema.execute("{ hello", backend=backend)
+        assert result.errors
+    assert len(parses) == 2
+    assert backend.stats()["size"] == 0
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""Unit tests for the batching loaders, without a TANGO host."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from tango import DevFailed
+
+from tangogql.loaders import AttributeReadLoader
+
+__docformat__ = "restructuredtext"
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class FakeProxy(object):
+    """Device proxy whose `bad` attributes cannot be read"""
+
+    def __init__(self, bad=()):
+        self.bad = bad
+        self.calls = []
+
+    async def read_attribute(self, name, extract_as=None):
+        self.calls.append(("read_attribute", name))
+        if name in self.bad:
+            raise DevFailed(name)
+        return SimpleNamespace(name=name, value=name.upper(),
+                               has_failed=False)
+
+    async def read_attributes(self, names, extract_as=None):
+        self.calls.append(("read_attributes", tuple(names)))
+        if any(name in self.bad for name in names):
+            raise DevFailed(*names)
+        return [SimpleNamespace(name=name, value=name.upper(),
+                                has_failed=False) for name in names]
+
+
+class FakeProxies(object):
+
+    def __init__(self, **proxies):
+        self.proxies = proxies
+
+    def get(self, device):
+        return self.proxies[device]
+
+
+def load_all(loader, requests):
+    async def main():
+        futures = [loader.load(device, name) for device, name in requests]
+        return await asyncio.gather(*futures, return_exceptions=True)
+    return run(main())
+
+
+def test_reads_grouped_per_device():
+    first, second = FakeProxy(), FakeProxy()
+    loader = AttributeReadLoader(FakeProxies(a=first, b=second))
+    reads = load_all(loader, [("a", "x"), ("b", "x"), ("a", "y"),
+                              ("a", "x")])
+    assert [read.value for read in reads] == ["X", "X", "Y", "X"]
+    assert first.calls == [("read_attributes", ("x", "y"))]
+    assert second.calls == [("read_attribute", "x")]
+
+
+def test_failed_batch_read_one_by_one():
+    proxy = FakeProxy(bad=("y",))
+    loader = AttributeReadLoader(FakeProxies(a=proxy))
+    x, y, z = load_all(loader, [("a", "x"), ("a", "y"), ("a", "z")])
+    assert proxy.calls == [("read_attributes", ("x", "y", "z")),
+                           ("read_attribute", "x"),
+                           ("read_attribute", "y"),
+                           ("read_attribute", "z")]
+    # One bad attribute does not fail the others
+    assert (x.value, z.value) == ("X", "Z")
+    assert isinstance(y, DevFailed)
+
+
+def test_failed_read_in_batch_result():
+    proxy = FakeProxy()
+    failed = SimpleNamespace(name="y", has_failed=True,
+                             get_err_stack=lambda: ("error",))
+
+    async def read_attributes(names, extract_as=None):
+        return [SimpleNamespace(name="x", value="X", has_failed=False),
+                failed]
+
+    proxy.read_attributes = read_attributes
+    loader = AttributeReadLoader(FakeProxies(a=proxy))
+    x, y = load_all(loader, [("a", "x"), ("a", "y")])
+    assert x.value == "X"
+    assert isinstance(y, DevFailed)
+
+
+def test_reads_of_later_ticks_not_grouped():
+    proxy = FakeProxy()
+    loader = AttributeReadLoader(FakeProxies(a=proxy))
+    load_all(loader, [("a", "x")])
+    load_all(loader, [("a", "y")])
+    assert proxy.calls == [("read_attribute", "x"), ("read_attribute", "y")]
+
+
+def test_unknown_device_fails_its_reads():
+    loader = AttributeReadLoader(FakeProxies())
+    with pytest.raises(KeyError):
+        run(loader.load("a", "x"))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+"""Unit tests for the MessagePack encoding of websocket messages."""
+
+import struct
+
+import msgpack
+import numpy as np
+import pytest
+
+from tangogql.packing import ARRAY_EXT_TYPE, dumps
+
+__docformat__ = "restructuredtext"
+
+
+def unpack(ext):
+    """Return the typecode, shape and values of a packed array"""
+    assert ext.code == ARRAY_EXT_TYPE
+    typecode, ndim = struct.unpack_from("<cB", ext.data)
+    shape = struct.unpack_from(f"<{ndim}I", ext.data, 2)
+    dtype = np.dtype(typecode.decode()).newbyteorder("<")
+    values = np.frombuffer(ext.data, dtype=dtype, offset=2 + 4 * ndim)
+    return typecode.decode(), shape, values.reshape(shape).tolist()
+
+
+def value(obj):
+    return msgpack.unpackb(dumps({"value": obj}), raw=False)["value"]
+
+
+@pytest.mark.parametrize("dtype, typecode", [
+    (np.uint8, "B"), (np.int16, "h"), (np.uint32, "I"), (np.int64, "q"),
+    (np.float32, "f"), (np.float64, "d"),
+])
+def test_arrays_keep_their_type(dtype, typecode):
+    array = np.arange(6, dtype=dtype).reshape(2, 3)
+    assert unpack(value(array)) == (typecode, (2, 3), array.tolist())
+
+
+def test_big_endian_arrays_packed_little_endian():
+    array = np.arange(4, dtype=">i4")
+    assert unpack(value(array)) == ("i", (4,), [0, 1, 2, 3])
+
+
+def test_lists_packed_in_narrowest_type():
+    assert unpack(value([1, -2, 3])) == ("b", (3,), [1, -2, 3])
+    assert unpack(value([[1, 300], [2, 3]])) == ("h", (2, 2),
+                                                 [[1, 300], [2, 3]])
+    assert unpack(value([1, 2 ** 40])) == ("q", (2,), [1, 2 ** 40])
+    assert unpack(value([1.5, 2])) == ("d", (2,), [1.5, 2.0])
+
+
+def test_other_values_packed_as_they_are():
+    assert value([True, False]) == [True, False]
+    assert value(np.array([True, False])) == [True, False]
+    assert value(["a", "b"]) == ["a", "b"]
+    # The rows of ragged lists are packed one by one
+    assert [unpack(row) for row in value([[1, 2], [3]])] == [
+        ("b", (2,), [1, 2]), ("b", (1,), [3])]
+    assert value([]) == []
+    assert value([{"x": 1}]) == [{"x": 1}]
+    assert value(np.float32(1.5)) == 1.5
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""Unit tests for the automatic persisted queries."""
+
+from hashlib import sha256
+
+import pytest
+
+from tangogql.persistedqueries import PersistedQueries, PersistedQueryError
+
+__docformat__ = "restructuredtext"
+
+QUERY = "{ info }"
+DIGEST = sha256(QUERY.encode()).hexdigest()
+
+
+def persisted(digest=DIGEST, version=1):
+    return {"persistedQuery": {"version": version, "sha256Hash": digest}}
+
+
+def code(queries, payload):
+    with pytest.raises(PersistedQueryError) as error:
+        queries.get_query(payload)
+    return error.value.to_dict()["extensions"]["code"]
+
+
+def test_query_registered_with_its_hash():
+    queries = PersistedQueries()
+    assert queries.get_query({"query": QUERY}) == QUERY
+    assert code(queries, {"extensions": persisted()}) == \
+        "PERSISTED_QUERY_NOT_FOUND"
+    assert queries.get_query({"query": QUERY,
+                              "extensions": persisted()}) == QUERY
+    assert queries.get_query({"extensions": persisted()}) == QUERY
+
+
+def test_bad_persisted_queries_rejected():
+    queries = PersistedQueries()
+    assert code(queries, {"query": QUERY,
+                          "extensions": persisted("0" * 64)}) == \
+        "BAD_PERSISTED_QUERY"
+    assert code(queries, {"extensions": persisted(version=2)}) == \
+        "PERSISTED_QUERY_NOT_SUPPORTED"
+
+
+@pytest.mark.parametrize("payload", [
+    {"extensions": "x"},
+    {"extensions": ["persistedQuery"]},
+    {"extensions": {"persistedQuery": "x"}},
+    {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": 1}}},
+    {"query": 1, "extensions": persisted()},
+])
+def test_malformed_payloads_rejected(payload):
+    assert code(PersistedQueries(), payload) == "BAD_PERSISTED_QUERY"
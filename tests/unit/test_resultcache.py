@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""Unit tests for the shared result cache."""
+
+import asyncio
+from types import SimpleNamespace
+
+from graphql.language.parser import parse
+
+from tangogql.resultcache import ResultCache, queried_devices, mutated_devices
+
+__docformat__ = "restructuredtext"
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+def document(query):
+    return SimpleNamespace(document_ast=parse(query))
+
+
+class Counter(object):
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"data": self.calls}
+
+
+def test_key_ignores_formatting():
+    cache = ResultCache(ttl=10)
+    first = document('{ device(name: "sys/tg_test/1") { name } }')
+    second = document('# comment\n{device(name:"sys/tg_test/1"){\n name}}')
+    assert cache.key(first) == cache.key(second)
+    assert cache.key(first, None, {"a": 1}) != cache.key(first, None, {"a": 2})
+
+
+def test_concurrent_identical_queries_execute_once():
+    cache = ResultCache(ttl=10)
+    execute = Counter()
+    query = document("{ devices { name state } }")
+
+    async def main():
+        results = await asyncio.gather(
+            *(cache.get(query, None, None, execute) for _ in range(5)))
+        results.append(await cache.get(query, None, None, execute))
+        return results
+
+    assert run(main()) == [{"data": 1}] * 6
+    assert execute.calls == 1
+
+
+def test_queried_devices():
+    assert queried_devices(document(
+        '{ device(name: "Sys/TG_Test/1") { name } }')) == {"sys/tg_test/1"}
+    assert queried_devices(document(
+        'query($n: [String]!) { attributes(fullNames: $n) { value } }'),
+        variables={"n": ["a/b/c/x", "d/e/f/y"]}) == {"a/b/c", "d/e/f"}
+    # Default and explicit patterns may match any device
+    assert queried_devices(document("{ devices { name state } }")) is None
+    assert queried_devices(document(
+        "{ domains { families { members { name } } } }")) is None
+    assert queried_devices(document("{ userActions { user } }")) is None
+    assert queried_devices(document(
+        '{ device(name: "sys/*/1") { name } }')) is None
+
+
+def test_mutation_invalidates_results_of_its_device():
+    cache = ResultCache(ttl=10)
+    execute = Counter()
+    queries = [document(query) for query in (
+        '{ device(name: "sys/tg_test/1") { state } }',
+        '{ device(name: "sys/tg_test/2") { state } }',
+        "{ devices { name state } }",
+        "{ userActions { user } }",
+    )]
+
+    async def main():
+        for query in queries:
+            await cache.get(query, None, None, execute)
+
+    run(main())
+    mutation = document(
+        'mutation { executeCommand(device: "SYS/TG_TEST/1", command: "On")'
+        ' { ok } }')
+    cache.invalidate(mutated_devices(mutation))
+    assert [key[0] for key, _ in cache.cache.items()] == [
+        cache.key(queries[1])[0]]
+    cache.invalidate(mutated_devices(document(
+        'mutation { setAttributeValue(name: "x", value: 1) { ok } }')))
+    assert len(cache.cache) == 0
+
+
+def test_invalidation_discards_running_execution():
+    cache = ResultCache(ttl=10)
+    execute = Counter()
+    query = document("{ devices { name } }")
+
+    async def main():
+        running = asyncio.ensure_future(cache.get(query, None, None, execute))
+        await asyncio.sleep(0)
+        cache.invalidate({"sys/tg_test/1"})
+        await running
+
+    run(main())
+    assert len(cache.cache) == 0
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+"""Unit tests for the execution of operations on /db, without a TANGO
+host."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from tangogql import routes
+from tangogql.resultcache import ResultCache
+
+__docformat__ = "restructuredtext"
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+@pytest.fixture
+def executions(monkeypatch):
+    """Queries executed, answered without a TANGO host"""
+    executed = []
+
+    async def fake_run(query, variables, operation_name, context):
+        executed.append(query)
+        if "fail" in query:
+            return {"errors": [{"message": "failed"}]}
+        return {"data": {"query": query}}
+
+    monkeypatch.setattr(routes, "_run", fake_run)
+    monkeypatch.setattr(routes, "result_cache", ResultCache(60))
+    return executed
+
+
+def query(device):
+    return f'{{ device(name: "{device}") {{ name }} }}'
+
+
+def test_mutation_invalidates_results_of_its_device(executions):
+    mutation = ('mutation { setAttributeValue(device: "sys/tg_test/1", '
+                'name: "ampli", value: 1) { ok } }')
+
+    async def main():
+        for device in ("sys/tg_test/1", "sys/tg_test/2"):
+            await routes._execute({"query": query(device)}, {})
+        await routes._execute({"query": mutation}, {})
+        for device in ("sys/tg_test/1", "sys/tg_test/2"):
+            await routes._execute({"query": query(device)}, {})
+
+    run(main())
+    assert executions == [query("sys/tg_test/1"), query("sys/tg_test/2"),
+                          mutation, query("sys/tg_test/1")]
+
+
+def test_cache_control_follows_result_cache(executions, monkeypatch):
+    assert routes._cache_control({"data": {}}) == "public, max-age=60"
+    assert routes._cache_control({"errors": []}) == "no-cache"
+    monkeypatch.setattr(routes, "result_cache", None)
+    assert routes._cache_control({"data": {}}) == "no-cache"
+
+
+def test_stats_lists_caches(executions):
+    response = run(routes.stats_handler(None))
+    stats = json.loads(response.body)
+    assert set(stats) == {"documents", "persistedQueries", "database",
+                          "results"}
+    assert stats["results"]["maxsize"] == 1000
+
+
+def post(monkeypatch, payload):
+    """POST payload to /db and return the decoded response"""
+    async def body():
+        return payload
+
+    monkeypatch.setattr(routes, "build_context", lambda request, config: {})
+    request = SimpleNamespace(json=body, app={"config": None})
+    response = run(routes.db_handler(request))
+    return json.loads(response.body)
+
+
+def test_batch_results_in_order(executions, monkeypatch):
+    async def slow_run(query, variables, operation_name, context):
+        # The first operations finish last
+        await asyncio.sleep(0.01 * (3 - variables["index"]))
+        return {"data": {"index": variables["index"]}}
+
+    monkeypatch.setattr(routes, "_run", slow_run)
+    monkeypatch.setattr(routes, "result_cache", None)
+    operations = [{"query": "{ info }", "variables": {"index": index}}
+                  for index in range(3)]
+    assert post(monkeypatch, operations) == [
+        {"data": {"index": index}} for index in range(3)]
+
+
+def test_batch_failure_isolated(executions, monkeypatch):
+    operations = [{"query": query("sys/tg_test/1")},
+                  {"query": "{ fail }"},
+                  "not an operation",
+                  {"query": query("sys/tg_test/2")}]
+    results = post(monkeypatch, operations)
+    assert results[0] == {"data": {"query": query("sys/tg_test/1")}}
+    assert results[1] == {"errors": [{"message": "failed"}]}
+    assert "errors" in results[2]
+    assert results[3] == {"data": {"query": query("sys/tg_test/2")}}
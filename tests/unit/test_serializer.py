@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+"""Unit tests for the JSON serialization of responses."""
+
+import datetime
+import importlib
+import json
+import sys
+
+import numpy as np
+import pytest
+
+from tangogql import serializer
+
+__docformat__ = "restructuredtext"
+
+VALUES = {
+    "array": np.arange(3, dtype=">i2"),
+    "image": np.eye(2, dtype=np.float32),
+    "scalar": np.float64(1.5),
+    "integer": np.uint8(7),
+    "boolean": np.bool_(True),
+    "time": datetime.datetime(2020, 1, 2, 3, 4, 5),
+    "date": datetime.date(2020, 1, 2),
+    "text": "tango",
+}
+EXPECTED = {
+    "array": [0, 1, 2],
+    "image": [[1.0, 0.0], [0.0, 1.0]],
+    "scalar": 1.5,
+    "integer": 7,
+    "boolean": True,
+    "time": "2020-01-02T03:04:05",
+    "date": "2020-01-02",
+    "text": "tango",
+}
+
+
+@pytest.fixture(params=["orjson", "json"])
+def dumps(request, monkeypatch):
+    """dumps with orjson, if installed, and with the json fallback"""
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setitem(sys.modules, "orjson", None)
+    yield importlib.reload(serializer).dumps
+    monkeypatch.undo()
+    importlib.reload(serializer)
+
+
+def test_dumps_numpy_and_dates(dumps):
+    data = dumps(VALUES)
+    assert isinstance(data, bytes)
+    assert json.loads(data) == EXPECTED
+
+
+def test_dumps_rejects_unknown_types(dumps):
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
+
+
+def test_orjson_writes_nan_as_null():
+    pytest.importorskip("orjson")
+    dumps = importlib.reload(serializer).dumps
+    assert json.loads(dumps({"value": [float("nan"), np.inf]})) == {
+        "value": [None, None]}
+
+
+def test_default_hook():
+    assert serializer._default(np.arange(2)) == [0, 1]
+    assert serializer._default(np.int32(3)) == 3
+    assert type(serializer._default(np.float32(0.5))) is float
+    assert serializer._default(datetime.date(2020, 1, 2)) == "2020-01-02"
+    with pytest.raises(TypeError):
+        serializer._default(object())
+
+
+def test_json_writes_nan(monkeypatch):
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    try:
+        dumps = importlib.reload(serializer).dumps
+        assert dumps({"value": [float("nan")]}) == b'{"value": [NaN]}'
+    finally:
+        monkeypatch.undo()
+        importlib.reload(serializer)
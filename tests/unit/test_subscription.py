@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+"""Unit tests for the subscription helpers."""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from graphql.language.parser import parse
+
+from tangogql.schema.subscription import _get_deltas
+
+__docformat__ = "restructuredtext"
+
+
+def info(query):
+    document = parse(query)
+    operation, *fragments = document.definitions
+    return SimpleNamespace(
+        field_asts=operation.selection_set.selections,
+        fragments={fragment.name.value: fragment for fragment in fragments},
+    )
+
+
+def read(value):
+    return SimpleNamespace(name="attr", value=value, w_value=None)
+
+
+def test_delta_rejects_reduce_arguments():
+    with pytest.raises(ValueError):
+        _get_deltas(info("subscription { attributes(fullNames: []) "
+                         "{ value(points: 1000) } }"), True, 100)
+    with pytest.raises(ValueError):
+        _get_deltas(info("subscription { attributes(fullNames: []) "
+                         "{ ...frame } } "
+                         "fragment frame on AttributeFrame "
+                         "{ writeValue(start: 10) }"), True, 100)
+    # Encoding does not change the indices
+    assert _get_deltas(info("subscription { attributes(fullNames: []) "
+                            "{ value(encoding: \"base64\") } }"), True, 100)
+    assert _get_deltas(info("subscription { attributes(fullNames: []) "
+                            "{ value(points: 1000) } }"), False, 100) is None
+
+
+def test_deltas_send_changes_between_keyframes():
+    deltas = _get_deltas(info("subscription { attributes(fullNames: []) "
+                              "{ value } }"), True, 3)
+    value = np.zeros(10)
+    frames = []
+    for index in range(4):
+        value = value.copy()
+        value[index] = 1
+        frame = SimpleNamespace(value=value, write_value=None)
+        frames.append(deltas.update("sys/tg_test/1", read(value), frame))
+    assert [frame.keyframe for frame in frames] == [True, False, False, True]
+    assert frames[1].value is None
+    assert [(change.start, list(change.values))
+            for change in frames[1].changes] == [(1, [1.0])]
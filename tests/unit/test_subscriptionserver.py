@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""Unit tests for the flow control of the subscription server."""
+
+import asyncio
+from types import SimpleNamespace
+
+from graphql.execution import ExecutionResult
+from graphql_ws.aiohttp import AiohttpConnectionContext
+
+from tangogql.subscriptionserver import PROTOCOL, SubscriptionServer
+
+__docformat__ = "restructuredtext"
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class SlowWebSocket(object):
+    """A websocket writing a message only when `writable` is set"""
+
+    ws_protocol = PROTOCOL
+    closed = False
+
+    def __init__(self):
+        self.writable = asyncio.Event()
+        self.sent = []
+
+    async def send_str(self, data):
+        await self.writable.wait()
+        self.sent.append(data)
+
+
+class Results(object):
+    """Execution result of a subscription, as given by graphql-core"""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    async def __aiter__(self):
+        return self._results()
+
+    async def _results(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            yield item
+
+
+def test_send_window_holds_back_frames():
+    server = SubscriptionServer(None, window=2)
+    ws = SlowWebSocket()
+    connection_context = AiohttpConnectionContext(ws, {"user": "test"})
+    params = server.get_graphql_params(connection_context, {})
+    window = params["context_value"]["send_window"]
+    queue = asyncio.Queue()
+    produced = []
+
+    async def produce():
+        # Frames are produced ahead of the sending, like a subscription
+        for index in range(5):
+            await window.acquire()
+            produced.append(index)
+            queue.put_nowait(ExecutionResult(data={"index": index}))
+        queue.put_nowait(None)
+
+    server.execute = lambda request_context, params: Results(queue)
+
+    async def main():
+        producer = asyncio.ensure_future(produce())
+        sending = asyncio.ensure_future(
+            server.on_start(connection_context, "1", params))
+        await asyncio.sleep(0.05)
+        # One frame is being written and one more may wait for it
+        assert produced == [0, 1]
+        ws.writable.set()
+        await asyncio.wait_for(asyncio.gather(producer, sending), 1)
+
+    run(main())
+    assert produced == [0, 1, 2, 3, 4]
+    # Five frames and the completion
+    assert len(ws.sent) == 6
+    assert window._value == 2
+
+
+def test_operations_get_their_own_context():
+    server = SubscriptionServer(None, window=2)
+    request_context = {"user": "test"}
+    connection_context = AiohttpConnectionContext(
+        SimpleNamespace(ws_protocol=PROTOCOL), request_context)
+    first = server.get_graphql_params(connection_context, {})
+    second = server.get_graphql_params(connection_context, {})
+    assert first["context_value"]["user"] == "test"
+    assert (first["context_value"]["send_window"]
+            is not second["context_value"]["send_window"])
+    assert "send_window" not in request_context
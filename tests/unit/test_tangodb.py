@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+
+"""Unit tests for the caches of tangodb, without a TANGO host."""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from tangogql import tangodb, ttlcache
+from tangogql.aioattribute import ReadError
+from tangogql.tangodb import (
+    AsyncDatabase, AttributeInfoCache, CachedMethod, DatabaseTimeoutError,
+    DeviceCalls, DeviceIndex, DeviceStateCache
+)
+
+try:
+    from contextlib import asynccontextmanager as contextmanager  # +3.7
+except ImportError:
+    from async_generator import asynccontextmanager as contextmanager
+
+__docformat__ = "restructuredtext"
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class FakeProxy(object):
+
+    def __init__(self):
+        self.reads = 0
+
+    async def state(self):
+        self.reads += 1
+        return "read"
+
+
+class FakeProxies(object):
+
+    def __init__(self):
+        self.proxy = FakeProxy()
+
+    def get(self, device):
+        return self.proxy
+
+
+class FakeSubscriptions(object):
+    """Subscriptions whose reads are put in `queue` by the test"""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.background = None
+
+    @contextmanager
+    async def attribute_reads(self, names, background=False):
+        self.background = background
+        yield self.queue
+
+
+def push(subscriptions, read):
+    subscriptions.queue.put_nowait(("sys/tg_test/1", read))
+
+
+async def stop(states):
+    watchers = list(states._watchers.values())
+    for watcher in watchers:
+        watcher.cancel()
+    await asyncio.gather(*watchers)
+
+
+def test_state_from_events_stays_fresh():
+    proxies = FakeProxies()
+    subscriptions = FakeSubscriptions()
+    states = DeviceStateCache(proxies, subscriptions, max_age=0.01)
+
+    async def main():
+        assert await states.get("sys/tg_test/1") == "read"
+        push(subscriptions, SimpleNamespace(name="State", value="ON"))
+        await asyncio.sleep(0.05)
+        state = await states.get("sys/tg_test/1")
+        await stop(states)
+        return state
+
+    assert run(main()) == "ON"
+    assert proxies.proxy.reads == 1
+    assert subscriptions.background
+
+
+def test_state_read_again_after_error_event():
+    proxies = FakeProxies()
+    subscriptions = FakeSubscriptions()
+    states = DeviceStateCache(proxies, subscriptions, max_age=0.01)
+
+    async def main():
+        await states.get("sys/tg_test/1")
+        push(subscriptions, SimpleNamespace(name="State", value="ON"))
+        push(subscriptions, ReadError("State", ()))
+        await asyncio.sleep(0.05)
+        state = await states.get("sys/tg_test/1")
+        await stop(states)
+        return state
+
+    assert run(main()) == "read"
+    assert proxies.proxy.reads == 2
+
+
+class FakeDatabase(object):
+
+    def __init__(self, delay=0, host="host1"):
+        self.delay = delay
+        self.host = host
+        self.lookups = 0
+
+    async def get_device_info(self, device):
+        self.lookups += 1
+        await asyncio.sleep(self.delay)
+        if self.host is None:
+            raise DatabaseTimeoutError("get_device_info", self.delay)
+        return SimpleNamespace(host=self.host)
+
+
+class BlockingProxies(object):
+    """Proxies whose calls take `delay` seconds, counting the calls
+    running at the same time"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.running = 0
+        self.most_running = 0
+        self.lock = threading.Lock()
+
+    def get(self, device):
+        return self
+
+    def info(self):
+        with self.lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        return "info"
+
+
+def test_device_calls_do_not_wait_for_host_lookup():
+    db = FakeDatabase(delay=0.5)
+    calls = DeviceCalls(BlockingProxies(0), db)
+
+    async def main():
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        assert await calls.call("sys/tg_test/1", "info") == "info"
+        assert await calls.call("sys/tg_test/1", "info") == "info"
+        elapsed = loop.time() - start
+        await asyncio.gather(*calls._lookups.values())
+        return elapsed
+
+    assert run(main()) < 0.2
+    # Looked up once, in the background
+    assert db.lookups == 1
+
+
+def test_device_calls_limited_per_known_host():
+    proxies = BlockingProxies(0.05)
+    calls = DeviceCalls(proxies, FakeDatabase(), limit=8, host_limit=2)
+
+    async def main():
+        devices = [f"sys/tg_test/{i}" for i in range(8)]
+        await asyncio.gather(*(calls.call(device, "info")
+                               for device in devices))
+        first = proxies.most_running
+        proxies.most_running = 0
+        await asyncio.gather(*(calls.call(device, "info")
+                               for device in devices))
+        return first, proxies.most_running
+
+    # Unknown hosts only count towards the overall limit
+    assert run(main()) == (8, 2)
+    # Idle hosts are forgotten
+    assert not calls._hosts
+
+
+def test_device_calls_unlimited_per_host_when_lookup_fails():
+    proxies = BlockingProxies(0.05)
+    calls = DeviceCalls(proxies, FakeDatabase(host=None), limit=8,
+                        host_limit=2)
+
+    async def main():
+        devices = [f"sys/tg_test/{i}" for i in range(8)]
+        for _ in range(2):
+            await asyncio.gather(*(calls.call(device, "info")
+                                   for device in devices))
+
+    run(main())
+    assert proxies.most_running == 8
+
+
+class FakeDeviceCalls(object):
+    """Device calls returning the configuration of attributes a and b"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def call(self, device, method, *args):
+        self.calls.append(method)
+        await asyncio.sleep(0.01)
+        if method == "attribute_list_query_ex":
+            return [SimpleNamespace(name="a"), SimpleNamespace(name="b")]
+        return SimpleNamespace(name=args[0])
+
+
+def test_attribute_infos_fetched_once_per_device():
+    device_calls = FakeDeviceCalls()
+    infos = AttributeInfoCache(device_calls)
+
+    async def main():
+        return await asyncio.gather(
+            infos.get("sys/tg_test/1", "a"), infos.get("sys/tg_test/1", "B"),
+            infos.get("SYS/tg_test/1", "a"))
+
+    assert [info.name for info in run(main())] == ["a", "b", "a"]
+    assert device_calls.calls == ["attribute_list_query_ex"]
+    assert run(infos.get("sys/tg_test/1", "b")).name == "b"
+    assert device_calls.calls == ["attribute_list_query_ex"]
+
+
+def test_unlisted_attribute_info_queried():
+    device_calls = FakeDeviceCalls()
+    infos = AttributeInfoCache(device_calls)
+    assert run(infos.get("sys/tg_test/1", "c")).name == "c"
+    assert run(infos.get("sys/tg_test/1", "c")).name == "c"
+    assert device_calls.calls == ["attribute_list_query_ex",
+                                  "attribute_query"]
+
+
+class Method(object):
+    """Asynchronous method counting its calls, failing when `error` is
+    set"""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.calls = 0
+        self.error = None
+
+    async def __call__(self, *args):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return (self.calls,) + args
+
+
+def fake_clock(monkeypatch):
+    """Replace time.monotonic in the caches, not in the event loop"""
+    clock = SimpleNamespace(now=1000.0)
+    clock.monotonic = lambda: clock.now
+    monkeypatch.setattr(tangodb, "time", clock)
+    monkeypatch.setattr(ttlcache, "time", clock)
+    return clock
+
+
+def test_cached_method_misses_share_one_call():
+    method = Method()
+    cached = CachedMethod(method, ttl=10)
+
+    async def main():
+        return await asyncio.gather(*(cached("x") for _ in range(10)))
+
+    assert run(main()) == [(1, "x")] * 10
+    assert run(cached("x")) == (1, "x")
+    assert method.calls == 1
+
+
+def test_cached_method_stale_value_refreshed_in_background(monkeypatch):
+    clock = fake_clock(monkeypatch)
+    method = Method(delay=0.05)
+    cached = CachedMethod(method, ttl=10, stale_ttl=20)
+
+    async def main():
+        assert await cached("x") == (1, "x")
+        clock.now += 15
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        # Stale, returned without waiting for the refresh
+        assert await cached("x") == (1, "x")
+        assert loop.time() - start < 0.02
+        await asyncio.sleep(0.1)
+        return await cached("x")
+
+    assert run(main()) == (2, "x")
+    assert method.calls == 2
+
+
+def test_cached_method_failed_refresh_keeps_value(monkeypatch):
+    clock = fake_clock(monkeypatch)
+    method = Method()
+    cached = CachedMethod(method, ttl=10, stale_ttl=20)
+
+    async def main():
+        await cached("x")
+        clock.now += 15
+        method.error = DatabaseTimeoutError("get_x", 10)
+        assert await cached("x") == (1, "x")
+        await asyncio.sleep(0.05)
+        # Still served, and refreshed once the method works again
+        assert await cached("x") == (1, "x")
+        method.error = None
+        await asyncio.sleep(0.05)
+        return await cached("x")
+
+    assert run(main()) == (3, "x")
+
+
+def test_cached_method_errors_not_cached():
+    method = Method()
+    cached = CachedMethod(method, ttl=10)
+    method.error = DatabaseTimeoutError("get_x", 10)
+    with pytest.raises(DatabaseTimeoutError):
+        run(cached("x"))
+    method.error = None
+    assert run(cached("x")) == (2, "x")
+
+
+class ListingDatabase(object):
+    """Database listing `names`, of which `exported` are exported"""
+
+    def __init__(self, names, exported=()):
+        self.names = names
+        self.exported = exported
+
+    async def command_inout(self, command, argin):
+        return list(self.names)
+
+    async def get_device_exported(self, pattern):
+        return list(self.exported)
+
+
+def test_device_index_case_insensitive():
+    db = ListingDatabase(["Sys/TG_Test/1", "Sys/TG_Test/2", "Sys/database/2",
+                          "dserver/DataBaseds/2"], exported=["sys/tg_test/1"])
+    index = DeviceIndex(db)
+
+    async def main():
+        assert await index.get_domains() == ["Sys", "dserver"]
+        assert await index.get_families("SYS") == ["TG_Test", "database"]
+        assert await index.get_members("sys", "tg_test") == ["1", "2"]
+        assert await index.get_members("*", "*", "2") == ["2"]
+        assert await index.get_families(pattern="database*") == [
+            "DataBaseds", "database"]
+        assert await index.get_exported("SYS/*") == ["Sys/TG_Test/1"]
+        assert await index.get_exported("sys/tg_test/*") == ["Sys/TG_Test/1"]
+        index._task.cancel()
+
+    run(main())
+
+
+def test_device_index_refresh_applies_differences():
+    db = ListingDatabase(["sys/tg_test/1", "sys/tg_test/2", "test/a/1"])
+    index = DeviceIndex(db)
+
+    async def main():
+        assert await index.get_domains() == ["sys", "test"]
+        db.names = ["sys/tg_test/2", "sys/tg_test/3", "lab/b/1"]
+        db.exported = db.names
+        await index.refresh()
+        assert await index.get_domains() == ["lab", "sys"]
+        assert await index.get_members("sys", "tg_test") == ["2", "3"]
+        assert await index.get_exported() == [
+            "lab/b/1", "sys/tg_test/2", "sys/tg_test/3"]
+        index._task.cancel()
+
+    run(main())
+
+
+def test_device_index_only_star_is_a_wildcard():
+    db = ListingDatabase(["sys/tg_test/1", "sys/tg_test/[1]", "sys/tg_test/?"],
+                       exported=["sys/tg_test/1", "sys/tg_test/[1]",
+                                 "sys/tg_test/?"])
+    index = DeviceIndex(db)
+
+    async def main():
+        assert await index.get_members("sys", "tg_test", "[1]") == ["[1]"]
+        assert await index.get_members("sys", "tg_test", "?") == ["?"]
+        assert await index.get_exported("sys/tg_test/?") == ["sys/tg_test/?"]
+        assert await index.get_exported("sys/tg*[1]") == ["sys/tg_test/[1]"]
+        index._task.cancel()
+
+    run(main())
+
+
+class SlowDatabase(object):
+
+    def get_info(self, delay):
+        time.sleep(delay)
+        return "info"
+
+
+def test_database_call_timeout():
+    database = AsyncDatabase(SlowDatabase(), max_workers=1, timeout=0.1)
+
+    async def main():
+        assert await database.get_info(0) == "info"
+        with pytest.raises(DatabaseTimeoutError):
+            await database.get_info(0.3)
+        # The timed out call still holds the only thread
+        with pytest.raises(DatabaseTimeoutError):
+            await database.get_info(0)
+        await asyncio.sleep(0.2)
+        return await database.get_info(0)
+
+    assert run(main()) == "info"
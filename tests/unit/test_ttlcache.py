@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""Unit tests for the TTL cache."""
+
+import pytest
+
+from tangogql import ttlcache
+from tangogql.ttlcache import TTLCache
+
+__docformat__ = "restructuredtext"
+
+
+class Clock(object):
+    """Replaces time.monotonic in the cache"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ttlcache, "time", clock)
+    return clock
+
+
+def test_least_recently_used_entry_evicted(clock):
+    cache = TTLCache(ttl=None, maxsize=2)
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache["a"] == 1
+    cache["c"] = 3
+    assert cache.keys() == ["a", "c"]
+    assert cache.evictions == 1
+    # Setting an existing key makes it the most recently used
+    cache["a"] = 4
+    cache["d"] = 5
+    assert cache.keys() == ["a", "d"]
+    assert cache.evictions == 2
+
+
+def test_expiry_follows_last_set(clock):
+    cache = TTLCache(ttl=10)
+    cache["a"] = 1
+    clock.now += 5
+    cache["b"] = 2
+    clock.now += 4
+    cache["a"] = 3
+    # "b" now expires first, "a" 9 seconds after it
+    clock.now += 2
+    assert cache.keys() == ["b", "a"]
+    clock.now += 4
+    assert cache.keys() == ["a"]
+    assert cache.get("b") is None
+    clock.now += 5
+    assert cache.get("a") is None
+    assert cache.expirations == 2
+
+
+def test_expired_entries_not_listed(clock):
+    cache = TTLCache(ttl=10)
+    cache["a"] = 1
+    clock.now += 5
+    cache["b"] = 2
+    assert "a" in cache and len(cache) == 2
+    clock.now += 5
+    assert "a" not in cache
+    assert "b" in cache
+    assert cache.keys() == ["b"]
+    assert cache.items() == [("b", 2)]
+    assert len(cache) == 1
+    clock.now += 5
+    assert "b" not in cache
+    assert len(cache) == 0
+
+
+def test_counters(clock):
+    cache = TTLCache(ttl=10, maxsize=1)
+    cache["a"] = 1
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    with pytest.raises(KeyError):
+        cache["b"]
+    # Neither contains nor items count
+    assert "a" in cache
+    assert cache.items() == [("a", 1)]
+    cache["b"] = 2
+    clock.now += 10
+    assert cache.stats() == {
+        "size": 0,
+        "maxsize": 1,
+        "hits": 1,
+        "misses": 2,
+        "evictions": 1,
+        "expirations": 1,
+    }
+    cache.clear()
+    assert cache.hits == 1
+
+
+def test_pop_and_delete(clock):
+    cache = TTLCache(ttl=10)
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache.pop("a") == 1
+    assert cache.pop("a", None) is None
+    with pytest.raises(KeyError):
+        cache.pop("a")
+    del cache["b"]
+    clock.now += 10
+    assert len(cache) == 0
+    assert cache.expirations == 0
+
+
+def test_maxsize_must_be_positive():
+    with pytest.raises(ValueError):
+        TTLCache(maxsize=0)